@@ -1,10 +1,20 @@
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 import re
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import or_, func
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
@@ -30,6 +40,70 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         hashed_password.encode('utf-8')
     )
 
+# bcrypt is deliberately slow (~100ms+ per call), so request handlers run it in
+# a process pool instead of tying up a threadpool worker for the whole hash.
+# The pool is per worker process, so size it for the CPUs each worker should
+# use (os.cpu_count() ignores container quotas). Workers are spawned rather
+# than forked: the app process already runs threads and holds DB connections.
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", "2"))
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+def start_hash_pool() -> None:
+    """Create the bcrypt process pool; called from the app's lifespan"""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=HASH_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+def shutdown_hash_pool() -> None:
+    """Stop the bcrypt process pool and its worker processes"""
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(cancel_futures=True)
+        _hash_pool = None
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the bcrypt process pool (the default threadpool if it isn't running)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the bcrypt process pool (the default threadpool if it isn't running)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, verify_password, plain_password, hashed_password)
+
+# Recent successful logins, so a client re-authenticating with the same
+# credentials within the TTL skips bcrypt. Entries are keyed by an HMAC of the
+# identifier and password (no plaintext is kept) and remember the stored hash,
+# so a password change invalidates them. Off unless LOGIN_CACHE_TTL_SECONDS is set.
+LOGIN_CACHE_TTL_SECONDS = float(os.getenv("LOGIN_CACHE_TTL_SECONDS", "0"))
+LOGIN_CACHE_MAX_ENTRIES = 1024
+_login_cache: "OrderedDict[bytes, tuple[float, str]]" = OrderedDict()
+
+def _login_cache_key(identifier: str, password: str) -> bytes:
+    message = identifier.encode("utf-8") + b"|" + hashlib.sha256(password.encode("utf-8")).digest()
+    return hmac.new(SECRET_KEY.encode("utf-8"), message, hashlib.sha256).digest()
+
+async def verify_login_password(identifier: str, plain_password: str, hashed_password: str) -> bool:
+    """verify_password_async, answered from the login cache for a recent repeat login"""
+    if LOGIN_CACHE_TTL_SECONDS <= 0:
+        return await verify_password_async(plain_password, hashed_password)
+
+    key = _login_cache_key(identifier, plain_password)
+    entry = _login_cache.get(key)
+    if entry and entry[0] > time.monotonic() and hmac.compare_digest(entry[1], hashed_password):
+        return True
+    if not await verify_password_async(plain_password, hashed_password):
+        return False
+
+    _login_cache[key] = (time.monotonic() + LOGIN_CACHE_TTL_SECONDS, hashed_password)
+    _login_cache.move_to_end(key)
+    while len(_login_cache) > LOGIN_CACHE_MAX_ENTRIES:
+        _login_cache.popitem(last=False)
+    return True
+
 # Token creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -40,7 +114,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """Decode and validate the bearer token (cached per request by FastAPI)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid or expired token",
@@ -49,23 +124,64 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        return username
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def get_current_user(payload: dict = Depends(get_token_payload)):
+    username: str = payload.get("sub")
+    return username
 
 def get_current_user_obj(
-    current_user: str = Depends(get_current_user),
+    payload: dict = Depends(get_token_payload),
     db: Session = Depends(get_db)
 ) -> User:
     """Get current user as User object"""
-    user = db.query(User).filter(User.username == current_user).first()
+    username = payload.get("sub")
+    user_id = payload.get("uid")
+    if user_id is not None:
+        # Primary-key lookup; served from the identity map if already loaded
+        user = db.get(User, user_id)
+        if user and user.username != username:
+            user = None  # id no longer belongs to the token's user
+    else:
+        # Tokens issued before uid was added to the claims
+        user = db.query(User).filter(User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+@dataclass(frozen=True)
+class AuthedUser:
+    """Identity and role flags carried in the access token's claims"""
+    id: int
+    username: str
+    role: Optional[str]
+    is_admin: bool
+    is_seller: bool
+
+def get_authed_user(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+) -> AuthedUser:
+    """
+    Current user from the token claims, without a users query.
+    Role changes take effect when the user next logs in (tokens last 30 min).
+    """
+    if payload.get("uid") is None:
+        # Tokens issued before uid was added to the claims
+        user = get_current_user_obj(payload, db)
+        return AuthedUser(user.id, user.username, user.role, bool(user.is_admin), bool(user.is_seller))
+    return AuthedUser(
+        id=payload["uid"],
+        username=payload["sub"],
+        role=payload.get("role"),
+        is_admin=bool(payload.get("is_admin")),
+        is_seller=bool(payload.get("is_seller")),
+    )
+
 def admin_only(
     current_user_obj: User = Depends(get_current_user_obj)
 ) -> User:
@@ -209,6 +325,56 @@ def require_customer(
         )
     return current_user_obj
 
+def require_customer_claims(
+    current_user: AuthedUser = Depends(get_authed_user)
+) -> AuthedUser:
+    """require_customer checked against the token claims, for endpoints that only need the user id"""
+    if not current_user.is_admin and current_user.is_seller:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Forbidden"
+        )
+    return current_user
+
+def require_customer_writer(
+    current_user: AuthedUser = Depends(require_customer_claims),
+    db: Session = Depends(get_db)
+) -> AuthedUser:
+    """
+    require_customer_claims for endpoints that write on the user's behalf:
+    one primary-key lookup confirms the account still exists and is active,
+    so a deleted or deactivated user's token can't keep writing rows.
+    """
+    is_active = db.query(User.is_active).filter(
+        User.id == current_user.id, User.username == current_user.username
+    ).scalar()
+    if is_active is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is not active"
+        )
+    return current_user
+
+# SQL form of require_customer, for queries that join User and check access inline
+CUSTOMER_ACCESS = or_(User.is_admin == True, func.coalesce(User.is_seller, False) == False)
+
+def check_customer_access(username: str, db: Session) -> None:
+    """
+    Raise the same errors as get_current_user_obj + require_customer.
+    Used when a CUSTOMER_ACCESS join came back empty, to tell "no rows"
+    apart from an unknown user or a seller.
+    """
+    user = db.query(User.is_admin, User.is_seller).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_admin and user.is_seller:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Forbidden"
+        )
+
 # ==================== VALIDATION FUNCTIONS ====================
 
 def validate_username(username: str) -> None:
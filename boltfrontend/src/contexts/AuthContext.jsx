@@ -21,7 +21,7 @@ export function AuthProvider({ children }) {
       if (token) {
         // Check if admin - if so, clear token (admin should use admin portal)
         try {
-          await API.get('/admin/sellers');
+          await API.get('/admin/sellers', { params: { limit: 1 } });
           // Admin detected - clear token and don't set user
           localStorage.removeItem('token');
           localStorage.removeItem('username');
@@ -44,7 +44,7 @@ export function AuthProvider({ children }) {
           
           // Not an admin, check if seller - if so, clear token (seller should use seller portal)
           try {
-            await API.get('/seller/products');
+            await API.get('/seller/products', { params: { limit: 1 } });
             // Seller detected - clear token and don't set user
             localStorage.removeItem('token');
             localStorage.removeItem('username');
@@ -134,7 +134,7 @@ export function AuthProvider({ children }) {
     if (!data.role) {
       try {
         // Check admin first (super admin) - if admin, don't allow login in main app
-        await API.get('/admin/sellers');
+        await API.get('/admin/sellers', { params: { limit: 1 } });
         // Admin detected - clear token and throw error
         localStorage.removeItem('token');
         localStorage.removeItem('username');
@@ -152,7 +152,7 @@ export function AuthProvider({ children }) {
         
         // Not an admin, check if seller - if seller, don't allow login in main app
         try {
-          await API.get('/seller/products');
+          await API.get('/seller/products', { params: { limit: 1 } });
           // Seller detected - clear token and throw error
           localStorage.removeItem('token');
           localStorage.removeItem('username');
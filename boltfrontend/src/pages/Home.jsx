@@ -62,7 +62,7 @@ export default function Home() {
     setLoading(true);
     try {
       if (searchQuery) {
-        const params = { name: searchQuery };
+        const params = { name: searchQuery, view: 'card' };
         if (gender) params.gender = gender;
         const response = await API.get('/products/search', { params });
         const data = response?.data || [];
@@ -70,7 +70,7 @@ export default function Home() {
         setProducts(data);
         setTotal(data.length);
       } else {
-        const params = { page, page_size: pageSize };
+        const params = { page, page_size: pageSize, view: 'card' };
         if (gender) params.gender = gender;
         const response = await API.get('/products/paginated', { params });
         const data = response?.data || {};
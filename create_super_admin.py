@@ -11,8 +11,8 @@ from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User
 from auth_utils import hash_password
-from email_utils import generate_otp, send_otp_email
-from datetime import datetime, timedelta
+from email_utils import send_otp_email
+from otp_service import issue_otp
 
 def create_super_admin(username: str, email: str, password: str, phone: str = None):
     """Create a super admin account"""
@@ -38,9 +38,6 @@ def create_super_admin(username: str, email: str, password: str, phone: str = No
             print(f"❌ Email '{email}' already exists")
             return False
         
-        # Generate OTP for email verification
-        otp = generate_otp()
-        expiry = datetime.utcnow() + timedelta(minutes=10)
         hashed_pw = hash_password(password)
         
         # Create super admin user
@@ -50,12 +47,12 @@ def create_super_admin(username: str, email: str, password: str, phone: str = No
             phone=phone,
             hashed_password=hashed_pw,
             is_active=False,  # Will be True after OTP verification
-            otp=otp,
-            otp_expiry=expiry,
             role="admin",
             is_admin=True,  # Super admin flag
             is_approved=True  # Auto-approved
         )
+        # Generate OTP for email verification
+        otp = issue_otp(super_admin)
         db.add(super_admin)
         db.commit()
         db.refresh(super_admin)
@@ -1,23 +1,84 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # SQLite database URL
 SQLALCHEMY_DATABASE_URL = "sqlite:///./shop.db"
 
+# Worker threads for sync endpoints (main.py applies this to the threadpool)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# Seconds a request waits for a pooled connection before failing, rather
+# than queueing behind a stuck worker indefinitely
+POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT", "2"))
+
 # Create engine
+# Size the pool so every threadpool worker can hold a connection instead of
+# waiting on the default 5 + 10. pre_ping/recycle are left off: SQLite
+# connections are local file handles that don't go stale.
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=THREADPOOL_SIZE // 2,
+    max_overflow=THREADPOOL_SIZE - THREADPOOL_SIZE // 2,
+    pool_timeout=POOL_TIMEOUT_SECONDS,
+    # Room for the compiled form of every distinct statement the API issues
+    query_cache_size=1200,
+)
+
+# Per-connection SQLite settings, applied once when the pool opens a connection.
+# WAL lets readers run alongside the single writer; synchronous=NORMAL is
+# durable under WAL except for the last transactions on power loss; writers
+# wait up to busy_timeout ms for the lock instead of failing immediately.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
 )
 
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def warm_pool():
+    """
+    Open the pool's persistent connections up front (running the PRAGMAs
+    above on each) so the first requests after startup don't pay for it.
+    """
+    connections = []
+    try:
+        for _ in range(engine.pool.size()):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.exec_driver_sql("SELECT 1")
+    finally:
+        for connection in connections:
+            connection.close()
+
 # Create session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps committed objects loaded, so endpoints can return
+# what they just wrote without a follow-up SELECT (db.refresh) per row.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
 
 
 # Dependency for FastAPI routes
+# One session per request: FastAPI caches the dependency within a request, so
+# the auth guards and the handler share it. A thread-local scoped_session is
+# not used because sync generator dependencies may run their setup and
+# teardown on different threadpool threads.
 def get_db():
     db = SessionLocal()
     try:
@@ -1,7 +1,12 @@
 import os
+import time
+import asyncio
+import queue
 import smtplib
-import random
+import secrets
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
@@ -18,45 +23,116 @@ SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))  # TLS
 SENDER_EMAIL = os.getenv("SENDER_EMAIL") or os.getenv("EMAIL_USER")
 APP_PASSWORD = os.getenv("APP_PASSWORD") or os.getenv("EMAIL_PASS")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_TIMEOUT = 30
+
+# SMTP replies that mean "try again" rather than "rejected"
+TRANSIENT_SMTP_CODES = {421, 450, 451}
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of logged-in SMTP connections.
+
+    STARTTLS + AUTH costs several round-trips and dominates the time of a
+    single send, so connections are kept open and reused. An idle connection
+    is checked with NOOP before reuse and replaced if the server dropped it.
+    """
+
+    def __init__(self, size: int):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        server.starttls()  # Secure connection
+        server.login(SENDER_EMAIL, APP_PASSWORD)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._close(server)
+
+    def send_message(self, msg):
+        """Send a message on a pooled connection, retrying once on a transient failure"""
+        with self._slots:
+            for attempt in range(2):
+                server = self._acquire()
+                try:
+                    server.send_message(msg)
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+                    self._close(server)
+                    code = getattr(e, "smtp_code", None)
+                    transient = isinstance(e, smtplib.SMTPServerDisconnected) or code in TRANSIENT_SMTP_CODES
+                    if attempt == 0 and transient:
+                        logger.warning(f"Transient SMTP error, retrying with a new connection: {e}")
+                        time.sleep(0.5)
+                        continue
+                    raise
+                except Exception:
+                    self._close(server)
+                    raise
+                self._idle.put(server)
+                return
+
+
+smtp_pool = SMTPConnectionPool(SMTP_POOL_SIZE)
+
+# Dedicated threads for SMTP sends awaited from async endpoints, so a slow mail
+# server ties up these threads rather than the request threadpool
+_SEND_POOL = ThreadPoolExecutor(max_workers=SMTP_POOL_SIZE, thread_name_prefix="smtp")
 
 
 def generate_otp() -> str:
-    """Generate 6-digit OTP"""
-    return str(random.randint(100000, 999999))
+    """Generate 6-digit OTP from the OS CSPRNG (no leading zero)"""
+    return str(100000 + secrets.randbelow(900000))
+
+
+OTP_EMAIL_SUBJECT = "Your OTP Verification Code - FastEcom"
+OTP_EMAIL_TEMPLATE = """Your OTP Verification Code - FastEcom
+
+Your verification code is: {otp}
+
+This code will expire in 10 minutes.
+
+If you didn't request this code, please ignore this email."""
 
 
 def send_otp_email(to_email: str, otp: str):
     """
-    Send OTP email - exact same logic as the working example
+    Send OTP email as a single plain-text part
     """
     if not SENDER_EMAIL or not APP_PASSWORD:
         error_msg = "Email credentials not configured. Please set SENDER_EMAIL and APP_PASSWORD in .env file."
         logger.error(error_msg)
         raise ValueError(error_msg)
-    
-    subject = "Your OTP Verification Code - FastEcom"
-    message = f"""Your OTP Verification Code - FastEcom
-
-Your verification code is: {otp}
 
-This code will expire in 10 minutes.
-
-If you didn't request this code, please ignore this email."""
-    
     try:
-        # Create the email - exact same as working example
-        msg = MIMEMultipart()
+        # A single text/plain part: no multipart boundary to generate and
+        # nothing to nest when the message is serialized
+        msg = MIMEText(OTP_EMAIL_TEMPLATE.format(otp=otp), "plain")
         msg["From"] = SENDER_EMAIL
         msg["To"] = to_email
-        msg["Subject"] = subject
+        msg["Subject"] = OTP_EMAIL_SUBJECT
 
-        msg.attach(MIMEText(message, "plain"))
-
-        # Connect to Gmail SMTP - exact same as working example
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()  # Secure connection
-            server.login(SENDER_EMAIL, APP_PASSWORD)
-            server.send_message(msg)
+        # Send over a pooled, already-authenticated SMTP connection
+        smtp_pool.send_message(msg)
 
         logger.info("✅ Email sent successfully!")
         return True
@@ -66,6 +142,17 @@ If you didn't request this code, please ignore this email."""
         raise
 
 
+async def send_email_async(send, *args):
+    """Run one of the send_* functions on the SMTP send pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_SEND_POOL, send, *args)
+
+
+async def send_otp_email_async(to_email: str, otp: str):
+    """Send an OTP email on the SMTP send pool without blocking the event loop"""
+    await send_email_async(send_otp_email, to_email, otp)
+
+
 def send_password_reset_email(to_email: str, reset_token: str, reset_url: str):
     """
     Send password reset email with reset link
@@ -165,10 +252,7 @@ This is an automated message. Please do not reply to this email.
         msg.attach(MIMEText(text_body, "plain"))
         msg.attach(MIMEText(html_body, "html"))
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, APP_PASSWORD)
-            server.send_message(msg)
+        smtp_pool.send_message(msg)
 
         logger.info(f"✅ Password reset email sent successfully to {to_email}")
         return True
@@ -263,10 +347,7 @@ This is an automated message. Please do not reply to this email.
         msg.attach(MIMEText(text_body, "plain"))
         msg.attach(MIMEText(html_body, "html"))
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, APP_PASSWORD)
-            server.send_message(msg)
+        smtp_pool.send_message(msg)
 
         logger.info(f"✅ Password reset success email sent to {to_email}")
         return True
@@ -1,29 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, UploadFile, File, WebSocket, WebSocketDisconnect, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import Response
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import timedelta, datetime
-from database import Base, engine, SessionLocal
-from models import Product as ProductModel, User, Order, OrderItem, CartItem, WishlistItem, Address, Review, ProductVariant, ProductImage
+from database import Base, engine, SessionLocal, THREADPOOL_SIZE, warm_pool
+from models import Product as ProductModel, User, Order, OrderItem, CartItem, WishlistItem, Address, Review, ProductVariant, ProductImage, normalize_product_gender_value
 from app.models.notification import Notification
 from app.schemas.notification import NotificationCreate
 from app.realtime.websocket_manager import websocket_manager
 from app.routes.admin.notification_routes import router as notification_router
 from app.routes.seller.notification_routes import router as seller_notification_router
-from schemas import ProductCreate, Product as ProductSchema, ProductListResponse, BulkProductCreate, BulkProductCreateResponse, UserCreate, UserResponse, UserDetailResponse, CartItemCreate, CartItemResponse, CartItemQuantityUpdate, OrderResponse, OrderItemResponse, WishlistItemResponse, VerifyOTPRequest, ResendOTPRequest, SellerCreate, SellerResponse, ForgotPasswordRequest, ResetPasswordRequest, AddressCreate, AddressUpdate, AddressResponse, ProfileResponse, ProfileUpdate, ChangePasswordRequest, SellerOrderItemResponse, SellerOrderItemListResponse, RejectOrderItemRequest, OverrideOrderItemStatusRequest, ProductWithSellerInfo, RejectProductRequest, ReturnRequestCreate, ReturnRejectRequest, ReturnOverrideRequest, ReturnItemResponse, ReturnListResponse, ReviewCreate, ReviewResponse, ProductDetailResponse, VariantCreate, VariantUpdate, VariantResponse, AdminProductResponse, ProductUpdate, SellerInfo, StockUpdateRequest, VariantStockUpdateRequest, InventoryItemResponse, InventoryListResponse, StockInfoResponse
-from auth_utils import hash_password, verify_password, create_access_token, get_current_user, get_current_user_obj, admin_only, seller_only, customer_only, require_admin, require_seller, require_approved_seller, require_customer, validate_username, validate_password_strength
+from schemas import ProductCreate, Product as ProductSchema, ProductListResponse, ProductCard as ProductCardSchema, ProductCardListResponse, BulkProductCreate, BulkProductCreateResponse, UserCreate, UserResponse, UserDetailResponse, CartItemCreate, CartItemResponse, CartItemQuantityUpdate, OrderResponse, OrderItemResponse, WishlistItemResponse, WishlistStatusResponse, WishlistBulkCheckRequest, VerifyOTPRequest, ResendOTPRequest, SellerCreate, SellerResponse, ForgotPasswordRequest, ResetPasswordRequest, AddressCreate, AddressUpdate, AddressResponse, ProfileResponse, ProfileUpdate, ChangePasswordRequest, SellerOrderItemResponse, SellerOrderItemListResponse, RejectOrderItemRequest, OverrideOrderItemStatusRequest, ProductWithSellerInfo, RejectProductRequest, BulkIdsRequest, ReturnRequestCreate, ReturnRejectRequest, ReturnOverrideRequest, ReturnItemResponse, ReturnListResponse, ReviewCreate, ReviewResponse, ProductDetailResponse, VariantCreate, VariantUpdate, VariantResponse, AdminProductResponse, ProductUpdate, SellerInfo, StockUpdateRequest, VariantStockUpdateRequest, InventoryItemResponse, InventoryListResponse, StockInfoResponse
+from auth_utils import hash_password, verify_password, hash_password_async, start_hash_pool, shutdown_hash_pool, verify_login_password, create_access_token, get_current_user, get_current_user_obj, admin_only, seller_only, customer_only, require_admin, require_seller, require_approved_seller, require_customer, AuthedUser, require_customer_claims, require_customer_writer, validate_username, validate_password_strength, CUSTOMER_ACCESS, check_customer_access
 from fastapi import Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import text, desc, or_, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import text, desc, or_, func, select, insert, update, delete, event, exists, lambda_stmt, bindparam, case, true
 import logging
 import os
 import json
+import hashlib
 import uuid
-from email_utils import generate_otp, send_otp_email, send_password_reset_email, send_password_reset_success_email
+import itertools
+import importlib.metadata
+import time
+import threading
+from collections import OrderedDict
+from typing import Literal
+from contextlib import asynccontextmanager
+from pydantic import TypeAdapter
+from anyio import to_thread
+from starlette.concurrency import run_in_threadpool
+from email_utils import send_email_async, send_otp_email_async, send_password_reset_email, send_password_reset_success_email
 from password_service import create_reset_token, validate_reset_token, invalidate_reset_token, check_rate_limit
+from otp_service import issue_otp, check_otp, consume_otp, clear_otp, record_failed_otp, allow_attempt, OTP_VALID, OTP_MISSING, OTP_INVALID, OTP_EXPIRED, VERIFY_ATTEMPT_LIMIT, VERIFY_WINDOW_SECONDS, RESEND_LIMIT, RESEND_WINDOW_SECONDS, LOGIN_ATTEMPT_LIMIT, LOGIN_IP_LIMIT, LOGIN_WINDOW_SECONDS, SIGNUP_IP_LIMIT, SIGNUP_WINDOW_SECONDS, redis_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("fastecom")
@@ -43,7 +58,20 @@ TAGS_METADATA = [
     {"name": "Admin Returns", "description": "Admin return management."},
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    run_migrations()
+    warm_pool()
+    # Sync endpoints (def) share one threadpool; match it to the DB pool size
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    start_hash_pool()
+    try:
+        yield
+    finally:
+        shutdown_hash_pool()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="FastEcom API",
     description="""
     Simple e-commerce API with auth, cart, and orders.
@@ -125,419 +153,78 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
-# Custom Swagger UI with alternative CDN (using unpkg.com instead of jsdelivr)
+# Swagger UI assets: served by the app from the swagger-ui-bundle package when
+# it is installed, otherwise from a pinned unpkg build
+try:
+    import swagger_ui_bundle
+except ImportError:  # Optional dependency
+    swagger_ui_bundle = None
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles for assets whose URL changes whenever their content does"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+if swagger_ui_bundle is not None:
+    # Version in the path so a package upgrade busts the immutable cache
+    SWAGGER_ASSETS_URL = f"/static/swagger/{importlib.metadata.version('swagger-ui-bundle')}"
+    app.mount(SWAGGER_ASSETS_URL, ImmutableStaticFiles(directory=swagger_ui_bundle.swagger_ui_path), name="swagger")
+else:
+    SWAGGER_ASSETS_URL = "https://unpkg.com/swagger-ui-dist@5.9.0"
+
+# The docs page only changes with the asset URL, so it is rendered once here and
+# served with an ETag for conditional requests
+_DOCS_HTML = get_swagger_ui_html(
+    openapi_url=app.openapi_url,
+    title=app.title + " - Swagger UI",
+    swagger_js_url=f"{SWAGGER_ASSETS_URL}/swagger-ui-bundle.js",
+    swagger_css_url=f"{SWAGGER_ASSETS_URL}/swagger-ui.css",
+    swagger_favicon_url="https://fastapi.tiangolo.com/img/favicon.png",
+    swagger_ui_parameters={
+        "persistAuthorization": True,
+        "displayRequestDuration": True,
+        "filter": True,  # Enable filter box
+    }
+).body
+_DOCS_HEADERS = {
+    "ETag": '"%s"' % hashlib.sha256(_DOCS_HTML).hexdigest()[:32],
+    "Cache-Control": "public, max-age=3600",
+}
+
 @app.get("/docs", include_in_schema=False)
-async def custom_swagger_ui_html():
-    return get_swagger_ui_html(
-        openapi_url=app.openapi_url,
-        title=app.title + " - Swagger UI",
-        swagger_js_url="https://unpkg.com/swagger-ui-dist@5.9.0/swagger-ui-bundle.js",
-        swagger_css_url="https://unpkg.com/swagger-ui-dist@5.9.0/swagger-ui.css",
-        swagger_favicon_url="https://fastapi.tiangolo.com/img/favicon.png",
-        swagger_ui_parameters={
-            "persistAuthorization": True,
-            "displayRequestDuration": True,
-            "filter": True,  # Enable filter box
-        }
-    )
+async def custom_swagger_ui_html(request: Request):
+    if request.headers.get("if-none-match") == _DOCS_HEADERS["ETag"]:
+        return Response(status_code=304, headers=_DOCS_HEADERS)
+    return Response(content=_DOCS_HTML, media_type="text/html", headers=_DOCS_HEADERS)
+
+# Storefront, admin and seller dev servers. Credentials are allowed, so origins
+# are listed explicitly rather than "*"; override with a comma-separated CORS_ORIGINS.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS",
+        ",".join(f"http://{host}:{port}" for host in ("localhost", "127.0.0.1") for port in (5173, 5174, 5175)),
+    ).split(",")
+    if origin.strip()
+]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173", "*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["*"],
+    max_age=3600,
 )
 
-# Create all tables in DB
-Base.metadata.create_all(bind=engine)
-
 # Include notification routes
 app.include_router(notification_router)
 app.include_router(seller_notification_router)
 
-# Safe migration: Add new verification columns if they don't exist
-def migrate_verification_fields():
-    """Safely add verification_status, verification_notes, submitted_at columns if they don't exist"""
-    try:
-        with engine.begin() as conn:  # Use begin() for automatic transaction management
-            # Check if verification_status column exists
-            result = conn.execute(text("PRAGMA table_info(products)"))
-            columns = [row[1] for row in result]
-            
-            if "verification_status" not in columns:
-                logger.info("Adding verification_status column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN verification_status VARCHAR DEFAULT 'Pending'"))
-                # Update existing products: if is_verified=True, set status=Approved, else Pending
-                conn.execute(text("UPDATE products SET verification_status = CASE WHEN is_verified = 1 THEN 'Approved' ELSE 'Pending' END"))
-            
-            if "verification_notes" not in columns:
-                logger.info("Adding verification_notes column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN verification_notes TEXT"))
-            
-            if "submitted_at" not in columns:
-                logger.info("Adding submitted_at column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN submitted_at DATETIME"))
-                # Set submitted_at to current time for existing products
-                conn.execute(text("UPDATE products SET submitted_at = datetime('now') WHERE submitted_at IS NULL"))
-                
-            logger.info("Migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Migration error: {e}")
-        # Don't fail startup if migration fails - columns might already exist
-
-# Safe migration: Add return fields to order_items if they don't exist
-def migrate_return_fields():
-    """Safely add return-related columns to order_items table if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            # Check if return_status column exists
-            result = conn.execute(text("PRAGMA table_info(order_items)"))
-            columns = [row[1] for row in result]
-            
-            if "return_status" not in columns:
-                logger.info("Adding return_status column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN return_status VARCHAR DEFAULT 'None'"))
-                # Create index for return_status
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_return_status ON order_items(return_status)"))
-            
-            if "return_reason" not in columns:
-                logger.info("Adding return_reason column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN return_reason TEXT"))
-            
-            if "return_notes" not in columns:
-                logger.info("Adding return_notes column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN return_notes TEXT"))
-            
-            if "return_requested_at" not in columns:
-                logger.info("Adding return_requested_at column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN return_requested_at DATETIME"))
-            
-            if "return_processed_at" not in columns:
-                logger.info("Adding return_processed_at column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN return_processed_at DATETIME"))
-            
-            if "is_return_eligible" not in columns:
-                logger.info("Adding is_return_eligible column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN is_return_eligible BOOLEAN DEFAULT 1"))
-                # Set existing items as eligible by default
-                conn.execute(text("UPDATE order_items SET is_return_eligible = 1 WHERE is_return_eligible IS NULL"))
-            
-            logger.info("Return fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Return fields migration error: {e}")
-        # Don't fail startup if migration fails - columns might already exist
-
-# Safe migration: Add product detail fields if they don't exist
-def migrate_product_detail_fields():
-    """Safely add new product detail columns if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            result = conn.execute(text("PRAGMA table_info(products)"))
-            columns = [row[1] for row in result]
-            
-            if "sizes" not in columns:
-                logger.info("Adding sizes column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN sizes TEXT"))
-            
-            if "colors" not in columns:
-                logger.info("Adding colors column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN colors TEXT"))
-            
-            if "variants" not in columns:
-                logger.info("Adding variants column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN variants TEXT"))
-            
-            if "size_fit" not in columns:
-                logger.info("Adding size_fit column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN size_fit TEXT"))
-            
-            if "material_care" not in columns:
-                logger.info("Adding material_care column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN material_care TEXT"))
-            
-            if "specifications" not in columns:
-                logger.info("Adding specifications column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN specifications TEXT"))
-            
-            logger.info("Product detail fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Product detail fields migration error: {e}")
-
-# Safe migration: Add size and color to cart_items if they don't exist
-def migrate_cart_item_fields():
-    """Safely add size and color columns to cart_items table if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            result = conn.execute(text("PRAGMA table_info(cart_items)"))
-            columns = [row[1] for row in result]
-            
-            if "size" not in columns:
-                logger.info("Adding size column to cart_items table")
-                conn.execute(text("ALTER TABLE cart_items ADD COLUMN size TEXT"))
-            
-            if "color" not in columns:
-                logger.info("Adding color column to cart_items table")
-                conn.execute(text("ALTER TABLE cart_items ADD COLUMN color TEXT"))
-            
-            logger.info("Cart item fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Cart item fields migration error: {e}")
-
-# Safe migration: Create reviews table if it doesn't exist
-def migrate_reviews_table():
-    """Safely create reviews table if it doesn't exist"""
-    try:
-        with engine.begin() as conn:
-            # Check if reviews table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='reviews'"))
-            if not result.fetchone():
-                logger.info("Creating reviews table")
-                # Create reviews table
-                conn.execute(text("""
-                    CREATE TABLE reviews (
-                        id INTEGER PRIMARY KEY,
-                        product_id INTEGER NOT NULL,
-                        user_id INTEGER NOT NULL,
-                        rating INTEGER NOT NULL,
-                        review_text TEXT,
-                        created_at DATETIME,
-                        FOREIGN KEY(product_id) REFERENCES products(id),
-                        FOREIGN KEY(user_id) REFERENCES users(id)
-                    )
-                """))
-                # Create indexes
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reviews_product_id ON reviews(product_id)"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_reviews_user_id ON reviews(user_id)"))
-                logger.info("Reviews table created successfully")
-    except Exception as e:
-        logger.exception(f"Reviews table migration error: {e}")
-
-# Safe migration: Create product_variants table if it doesn't exist
-def migrate_product_variants_table():
-    """Safely create product_variants table if it doesn't exist"""
-    try:
-        with engine.begin() as conn:
-            # Check if product_variants table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='product_variants'"))
-            if not result.fetchone():
-                logger.info("Creating product_variants table")
-                conn.execute(text("""
-                    CREATE TABLE product_variants (
-                        id INTEGER PRIMARY KEY,
-                        product_id INTEGER NOT NULL,
-                        size TEXT,
-                        color TEXT,
-                        image_url TEXT,
-                        price REAL,
-                        stock INTEGER DEFAULT 0,
-                        created_at DATETIME,
-                        updated_at DATETIME,
-                        FOREIGN KEY(product_id) REFERENCES products(id)
-                    )
-                """))
-                # Create indexes
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_product_variants_product_id ON product_variants(product_id)"))
-                logger.info("Product variants table created successfully")
-    except Exception as e:
-        logger.exception(f"Product variants table migration error: {e}")
-
-# Safe migration: Add variant_id to cart_items and order_items
-def migrate_variant_id_fields():
-    """Safely add variant_id columns to cart_items and order_items if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            # Check cart_items columns
-            result = conn.execute(text("PRAGMA table_info(cart_items)"))
-            cart_columns = [row[1] for row in result]
-            
-            if "variant_id" not in cart_columns:
-                logger.info("Adding variant_id column to cart_items table")
-                conn.execute(text("ALTER TABLE cart_items ADD COLUMN variant_id INTEGER"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cart_items_variant_id ON cart_items(variant_id)"))
-            
-            # Check order_items columns
-            result = conn.execute(text("PRAGMA table_info(order_items)"))
-            order_columns = [row[1] for row in result]
-            
-            if "variant_id" not in order_columns:
-                logger.info("Adding variant_id column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN variant_id INTEGER"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_variant_id ON order_items(variant_id)"))
-            
-            if "variant_size" not in order_columns:
-                logger.info("Adding variant_size column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN variant_size TEXT"))
-            
-            if "variant_color" not in order_columns:
-                logger.info("Adding variant_color column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN variant_color TEXT"))
-            
-            if "variant_image_url" not in order_columns:
-                logger.info("Adding variant_image_url column to order_items table")
-                conn.execute(text("ALTER TABLE order_items ADD COLUMN variant_image_url TEXT"))
-            
-            logger.info("Variant ID fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Variant ID fields migration error: {e}")
-
-# Safe migration: Add stock fields to products table
-def migrate_stock_fields():
-    """Safely add stock, low_stock_threshold, and status columns to products table if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            result = conn.execute(text("PRAGMA table_info(products)"))
-            columns = [row[1] for row in result]
-            
-            if "stock" not in columns:
-                logger.info("Adding stock column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN stock INTEGER DEFAULT 0"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_stock ON products(stock)"))
-            
-            if "low_stock_threshold" not in columns:
-                logger.info("Adding low_stock_threshold column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN low_stock_threshold INTEGER DEFAULT 5"))
-            
-            if "status" not in columns:
-                logger.info("Adding status column to products table")
-                conn.execute(text("ALTER TABLE products ADD COLUMN status VARCHAR DEFAULT 'IN_STOCK'"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_status ON products(status)"))
-                # Update existing products: set status based on stock
-                conn.execute(text("""
-                    UPDATE products 
-                    SET status = CASE 
-                        WHEN stock <= 0 THEN 'OUT_OF_STOCK'
-                        WHEN stock <= COALESCE(low_stock_threshold, 5) THEN 'LOW_STOCK'
-                        ELSE 'IN_STOCK'
-                    END
-                """))
-            
-            logger.info("Stock fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"Stock fields migration error: {e}")
-
-# Safe migration: Create product_images table and migrate old image_url data
-def migrate_product_images():
-    """Safely create product_images table and migrate old image_url data"""
-    try:
-        with engine.begin() as conn:
-            # Check if product_images table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='product_images'"))
-            if not result.fetchone():
-                logger.info("Creating product_images table")
-                conn.execute(text("""
-                    CREATE TABLE product_images (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        product_id INTEGER NOT NULL,
-                        image_url TEXT NOT NULL,
-                        is_primary BOOLEAN DEFAULT 0,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY(product_id) REFERENCES products(id)
-                    )
-                """))
-                # Create indexes
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_product_images_product_id ON product_images(product_id)"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_product_images_is_primary ON product_images(is_primary)"))
-                logger.info("Product images table created successfully")
-            
-            # Migrate old image_url data from products table
-            logger.info("Migrating old image_url data to product_images table")
-            products_with_images = conn.execute(text("""
-                SELECT id, image_url FROM products 
-                WHERE image_url IS NOT NULL AND image_url != ''
-            """)).fetchall()
-            
-            migrated_count = 0
-            for row in products_with_images:
-                product_id, image_url = row[0], row[1]
-                # Check if product already has images
-                existing = conn.execute(text("""
-                    SELECT 1 FROM product_images WHERE product_id = :pid
-                """), {"pid": product_id}).fetchone()
-                
-                if not existing and image_url:
-                    # Store image URL as-is (normalization will happen when products are loaded)
-                    # Insert as primary image
-                    conn.execute(text("""
-                        INSERT INTO product_images (product_id, image_url, is_primary)
-                        VALUES (:pid, :url, 1)
-                    """), {"pid": product_id, "url": image_url})
-                    migrated_count += 1
-            
-            if migrated_count > 0:
-                logger.info(f"Migrated {migrated_count} product images from old image_url field")
-            else:
-                logger.info("No products to migrate (all already migrated or no images)")
-                
-    except Exception as e:
-        logger.exception(f"Product images migration error: {e}")
-
-# Safe migration: Add user role and status columns if they don't exist
-def migrate_user_fields():
-    """Safely add role, is_seller, is_admin, is_verified, is_approved, has_address, gender, dob columns to users table if they don't exist"""
-    try:
-        with engine.begin() as conn:
-            # Check existing columns
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            columns = {row[1]: row for row in result}
-            
-            # Define columns to add with their SQL definitions
-            columns_to_add = [
-                ("is_seller", "BOOLEAN DEFAULT 0"),
-                ("is_admin", "BOOLEAN DEFAULT 0"),
-                ("is_verified", "BOOLEAN DEFAULT 0"),
-                ("is_approved", "BOOLEAN DEFAULT 0"),
-                ("role", "TEXT DEFAULT 'customer'"),
-                ("has_address", "BOOLEAN DEFAULT 0"),
-                ("gender", "TEXT"),
-                ("dob", "TEXT"),
-            ]
-            
-            for col_name, col_def in columns_to_add:
-                if col_name not in columns:
-                    logger.info(f"Adding {col_name} column to users table")
-                    try:
-                        conn.execute(text(f"ALTER TABLE users ADD COLUMN {col_name} {col_def}"))
-                        logger.info(f"Successfully added {col_name} column")
-                    except Exception as e:
-                        logger.warning(f"Failed to add {col_name} column (may already exist): {e}")
-                else:
-                    logger.debug(f"Column {col_name} already exists, skipping")
-            
-            # Update role for existing users based on is_admin flag (if role doesn't exist)
-            # This is a one-time migration for existing data
-            try:
-                conn.execute(text("""
-                    UPDATE users 
-                    SET role = CASE 
-                        WHEN is_admin = 1 THEN 'admin'
-                        WHEN is_seller = 1 THEN 'seller'
-                        ELSE 'customer'
-                    END
-                    WHERE role IS NULL OR role = ''
-                """))
-                logger.info("Updated role for existing users based on flags")
-            except Exception as e:
-                logger.debug(f"Role update migration skipped (may not be needed): {e}")
-                
-            logger.info("User fields migration completed successfully")
-    except Exception as e:
-        logger.exception(f"User fields migration error: {e}")
-        # Don't fail startup if migration fails
-
-# Run migrations on startup
-migrate_user_fields()  # Run user migration first
-migrate_verification_fields()
-migrate_return_fields()
-migrate_product_detail_fields()
-migrate_cart_item_fields()
-migrate_reviews_table()
-migrate_product_variants_table()
-migrate_variant_id_fields()
-migrate_stock_fields()
-migrate_product_images()  # Migrate product images
-
 # Static file serving for uploads
 UPLOADS_DIR = "uploads"
 os.makedirs(UPLOADS_DIR, exist_ok=True)
@@ -596,316 +283,537 @@ def normalize_image_url(image_url: str | None) -> str | None:
     return f"/images/{clean_filename}"
 
 # Global exception handler to ensure CORS headers on errors
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={"detail": exc.detail},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
+# HTTPException responses pass back through CORSMiddleware, so FastAPI's default
+# handler is enough. Unhandled errors are answered by the outermost server-error
+# middleware, outside CORS, so that handler still sets the headers itself.
+# Only the simple-response headers are needed; preflights never reach here.
+_CORS_ORIGIN_SET = frozenset(CORS_ORIGINS)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.exception(f"Unhandled exception: {exc}")
-    return JSONResponse(
-        status_code=500,
-        content={"detail": str(exc)},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
+    headers = {"Vary": "Origin"}
+    origin = request.headers.get("origin")
+    if origin in _CORS_ORIGIN_SET:
+        headers["Access-Control-Allow-Origin"] = origin
+        headers["Access-Control-Allow-Credentials"] = "true"
+    return JSONResponse(status_code=500, content={"detail": str(exc)}, headers=headers)
+
+# Migration: columns added to existing tables after they were first created,
+# in the order they were introduced. Fresh databases get every column from
+# create_all; older ones are brought up to date here. Each entry is
+# (table, column, definition, statements to run only when the column is added).
+SCHEMA_COLUMNS = [
+    # users
+    ("users", "is_active", "BOOLEAN DEFAULT 0", ()),
+    ("users", "otp", "TEXT", ()),
+    ("users", "otp_expiry", "DATETIME", ()),
+    ("users", "is_seller", "BOOLEAN DEFAULT 0", ()),
+    ("users", "is_admin", "BOOLEAN DEFAULT 0", ()),
+    ("users", "is_verified", "BOOLEAN DEFAULT 0", ()),
+    ("users", "is_approved", "BOOLEAN DEFAULT 0", ()),
+    # The column default fills every existing row, so derive roles from the flags
+    ("users", "role", "TEXT DEFAULT 'customer'", (
+        "UPDATE users SET role = CASE "
+        "WHEN is_admin = 1 THEN 'admin' WHEN is_seller = 1 THEN 'seller' ELSE 'customer' END",
+    )),
+    ("users", "has_address", "BOOLEAN DEFAULT 0", ()),
+    ("users", "gender", "TEXT", ()),
+    ("users", "dob", "TEXT", ()),
+    ("users", "reset_token", "TEXT", (
+        "CREATE INDEX IF NOT EXISTS idx_users_reset_token ON users(reset_token)",
+    )),
+    ("users", "reset_token_expires", "DATETIME", ()),
+    # products; ensure_schema also backfills NULL gender/category on every schema upgrade
+    ("products", "gender", "TEXT", (
+        "UPDATE products SET gender = 'unisex' WHERE gender IS NULL",
+    )),
+    ("products", "category", "TEXT", (
+        "UPDATE products SET category = 'general' WHERE category IS NULL",
+    )),
+    ("products", "seller_id", "INTEGER", ()),
+    # Existing products count as verified (backward compatibility)
+    ("products", "is_verified", "BOOLEAN DEFAULT 0", (
+        "UPDATE products SET is_verified = 1 WHERE is_verified IS NULL",
+    )),
+    ("products", "verification_status", "VARCHAR DEFAULT 'Pending'", (
+        "UPDATE products SET verification_status = CASE WHEN is_verified = 1 THEN 'Approved' ELSE 'Pending' END",
+    )),
+    ("products", "verification_notes", "TEXT", ()),
+    ("products", "submitted_at", "DATETIME", (
+        "UPDATE products SET submitted_at = datetime('now') WHERE submitted_at IS NULL",
+    )),
+    ("products", "sizes", "TEXT", ()),
+    ("products", "colors", "TEXT", ()),
+    ("products", "variants", "TEXT", ()),
+    ("products", "size_fit", "TEXT", ()),
+    ("products", "material_care", "TEXT", ()),
+    ("products", "specifications", "TEXT", ()),
+    ("products", "stock", "INTEGER DEFAULT 0", (
+        "CREATE INDEX IF NOT EXISTS ix_products_stock ON products(stock)",
+    )),
+    ("products", "low_stock_threshold", "INTEGER DEFAULT 5", ()),
+    ("products", "status", "VARCHAR DEFAULT 'IN_STOCK'", (
+        "CREATE INDEX IF NOT EXISTS ix_products_status ON products(status)",
+        "UPDATE products SET status = CASE "
+        "WHEN stock <= 0 THEN 'OUT_OF_STOCK' "
+        "WHEN stock <= COALESCE(low_stock_threshold, 5) THEN 'LOW_STOCK' "
+        "ELSE 'IN_STOCK' END",
+    )),
+    # cart_items
+    ("cart_items", "size", "TEXT", ()),
+    ("cart_items", "color", "TEXT", ()),
+    ("cart_items", "variant_id", "INTEGER", (
+        "CREATE INDEX IF NOT EXISTS ix_cart_items_variant_id ON cart_items(variant_id)",
+    )),
+    # orders: shipping snapshot
+    ("orders", "ship_name", "TEXT", ()),
+    ("orders", "ship_phone", "TEXT", ()),
+    ("orders", "ship_address_line1", "TEXT", ()),
+    ("orders", "ship_address_line2", "TEXT", ()),
+    ("orders", "ship_city", "TEXT", ()),
+    ("orders", "ship_state", "TEXT", ()),
+    ("orders", "ship_country", "TEXT", ()),
+    ("orders", "ship_pincode", "TEXT", ()),
+    ("orders", "ordered_at", "DATETIME", ()),
+    ("orders", "delivery_address", "TEXT", ()),
+    # order_items: returns, variant snapshot, seller routing
+    ("order_items", "return_status", "VARCHAR DEFAULT 'None'", (
+        "CREATE INDEX IF NOT EXISTS ix_order_items_return_status ON order_items(return_status)",
+    )),
+    ("order_items", "return_reason", "TEXT", ()),
+    ("order_items", "return_notes", "TEXT", ()),
+    ("order_items", "return_requested_at", "DATETIME", ()),
+    ("order_items", "return_processed_at", "DATETIME", ()),
+    ("order_items", "is_return_eligible", "BOOLEAN DEFAULT 1", (
+        "UPDATE order_items SET is_return_eligible = 1 WHERE is_return_eligible IS NULL",
+    )),
+    ("order_items", "variant_id", "INTEGER", (
+        "CREATE INDEX IF NOT EXISTS ix_order_items_variant_id ON order_items(variant_id)",
+    )),
+    ("order_items", "variant_size", "TEXT", ()),
+    ("order_items", "variant_color", "TEXT", ()),
+    ("order_items", "variant_image_url", "TEXT", ()),
+    ("order_items", "seller_id", "INTEGER", (
+        "CREATE INDEX IF NOT EXISTS idx_order_items_seller_id ON order_items(seller_id)",
+    )),
+    ("order_items", "status", "TEXT DEFAULT 'Pending'", (
+        "CREATE INDEX IF NOT EXISTS idx_order_items_status ON order_items(status)",
+    )),
+    ("order_items", "rejection_reason", "TEXT", ()),
+]
 
-# Lightweight migration: add missing columns to products and backfill defaults
-def ensure_product_columns():
-    with engine.connect() as conn:
-        # discover existing columns
-        result = conn.execute(text("PRAGMA table_info(products)"))
-        existing = {row[1] for row in result.fetchall()}
-        to_add = []
-        if 'gender' not in existing:
-            to_add.append("ALTER TABLE products ADD COLUMN gender TEXT")
-        if 'category' not in existing:
-            to_add.append("ALTER TABLE products ADD COLUMN category TEXT")
-        for stmt in to_add:
-            try:
+def ensure_schema():
+    """
+    Add any missing SCHEMA_COLUMNS and run the data backfills, in one
+    transaction, reading each table's columns once.
+    """
+    try:
+        with engine.begin() as conn:
+            existing = {
+                table: {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+                for table in dict.fromkeys(table for table, _, _, _ in SCHEMA_COLUMNS)
+            }
+            statements = []
+            for table, column, definition, follow_up in SCHEMA_COLUMNS:
+                if existing[table] and column not in existing[table]:
+                    statements.append(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    statements.extend(follow_up)
+            for stmt in statements:
                 conn.execute(text(stmt))
-            except Exception:
-                # if already exists due to race, ignore
-                pass
-        # backfill defaults for NULLs
-        try:
-            conn.execute(text("UPDATE products SET gender = COALESCE(gender, 'unisex')"))
-            conn.execute(text("UPDATE products SET category = COALESCE(category, 'general')"))
-        except Exception:
-            logger.exception("Backfill failed for products gender/category")
-
-ensure_product_columns()
+                logger.info(f"Schema migration: {stmt}")
+
+            # Products saved without a gender or category before the model filled
+            # them in; NULL gender would drop out of the men/women listings
+            conn.execute(text("UPDATE products SET gender = 'unisex' WHERE gender IS NULL"))
+            conn.execute(text("UPDATE products SET category = 'general' WHERE category IS NULL"))
+
+            # Roles for accounts created before the role column, from their flags
+            conn.execute(text(
+                "UPDATE users SET role = CASE "
+                "WHEN is_admin = 1 THEN 'admin' WHEN is_seller = 1 THEN 'seller' ELSE 'customer' END "
+                "WHERE role IS NULL OR role = ''"
+            ))
+            # Products still carrying only the legacy image_url get it as their primary image
+            migrated = conn.execute(text(
+                "INSERT INTO product_images (product_id, image_url, is_primary) "
+                "SELECT id, image_url, 1 FROM products "
+                "WHERE image_url IS NOT NULL AND image_url != '' "
+                "AND NOT EXISTS (SELECT 1 FROM product_images WHERE product_images.product_id = products.id)"
+            )).rowcount
+            if migrated:
+                logger.info(f"Migrated {migrated} product images from old image_url field")
+    except Exception as e:
+        logger.exception(f"Error during schema migration: {e}")
+        return False
 
-# Lightweight migration: add missing columns to users table for OTP verification
-def ensure_user_otp_columns():
+# Migration: make sure the login lookup columns are indexed on older databases
+def ensure_user_login_indexes():
     try:
         with engine.begin() as conn:
-            # Check if users table exists
             result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
             if not result.fetchone():
-                logger.info("Users table does not exist yet, will be created by Base.metadata.create_all()")
                 return
-            
-            # discover existing columns
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            existing = {row[1] for row in result.fetchall()}
-            to_add = []
-            if 'is_active' not in existing:
-                to_add.append("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 0")
-            if 'otp' not in existing:
-                to_add.append("ALTER TABLE users ADD COLUMN otp TEXT")
-            if 'otp_expiry' not in existing:
-                to_add.append("ALTER TABLE users ADD COLUMN otp_expiry DATETIME")
-            for stmt in to_add:
+            for column, where in (("username", ""), ("email", ""), ("phone", " WHERE phone IS NOT NULL")):
                 try:
-                    conn.execute(text(stmt))
-                    logger.info(f"Added column to users table: {stmt}")
+                    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_users_{column} ON users({column}){where}"))
                 except Exception as e:
-                    # if already exists due to race, ignore
-                    logger.warning(f"Column might already exist: {e}")
-                    pass
+                    # Legacy duplicates block a unique index; still index the lookup
+                    logger.warning(f"Could not create unique index on users.{column}: {e}")
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_users_{column} ON users({column})"))
     except Exception as e:
-        logger.exception(f"Error during user OTP columns migration: {e}")
-
-ensure_user_otp_columns()
+        logger.exception(f"Error during user login index migration: {e}")
+        return False
 
-# Migration: Add role and is_approved to users, seller_id and is_verified to products
-def ensure_role_columns():
+# Migration: unique (user_id, product_id) index on wishlist_items
+def ensure_wishlist_unique_index():
     try:
         with engine.begin() as conn:
-            # Check if users table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
+            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='wishlist_items'"))
             if not result.fetchone():
-                logger.info("Users table does not exist yet, will be created by Base.metadata.create_all()")
                 return
-            
-            # Check existing columns in users table
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            existing_users = {row[1] for row in result.fetchall()}
-            
-            if 'role' not in existing_users:
-                conn.execute(text("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'customer'"))
-                logger.info("Added role column to users table")
-                # Backfill existing users with 'customer' role
-                conn.execute(text("UPDATE users SET role = 'customer' WHERE role IS NULL"))
-            
-            if 'is_approved' not in existing_users:
-                conn.execute(text("ALTER TABLE users ADD COLUMN is_approved BOOLEAN DEFAULT 0"))
-                logger.info("Added is_approved column to users table")
-            
-            # Check existing columns in products table
-            result = conn.execute(text("PRAGMA table_info(products)"))
-            existing_products = {row[1] for row in result.fetchall()}
-            
-            if 'seller_id' not in existing_products:
-                conn.execute(text("ALTER TABLE products ADD COLUMN seller_id INTEGER"))
-                logger.info("Added seller_id column to products table")
-            
-            if 'is_verified' not in existing_products:
-                conn.execute(text("ALTER TABLE products ADD COLUMN is_verified BOOLEAN DEFAULT 0"))
-                logger.info("Added is_verified column to products table")
-                # Backfill existing products as verified (for backward compatibility)
-                conn.execute(text("UPDATE products SET is_verified = 1 WHERE is_verified IS NULL"))
+            # Drop duplicate rows left from before the constraint, keeping the oldest
+            removed = conn.execute(text(
+                "DELETE FROM wishlist_items WHERE id NOT IN "
+                "(SELECT MIN(id) FROM wishlist_items GROUP BY user_id, product_id)"
+            )).rowcount
+            if removed:
+                logger.info(f"Removed {removed} duplicate wishlist rows")
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_wishlist_user_product ON wishlist_items(user_id, product_id)"))
     except Exception as e:
-        logger.exception(f"Error during role columns migration: {e}")
+        logger.exception(f"Error during wishlist index migration: {e}")
+        return False
 
-ensure_role_columns()
-
-# Lightweight migration: add missing columns to order_items and orders tables
-def ensure_order_seller_columns():
+# Migration: lowercase products.gender and index the storefront listing filter
+def ensure_product_gender_index():
     try:
         with engine.begin() as conn:
-            # Check if order_items table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='order_items'"))
+            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='products'"))
             if not result.fetchone():
-                logger.info("order_items table does not exist yet, will be created by Base.metadata.create_all()")
-            else:
-                # discover existing columns in order_items
-                result = conn.execute(text("PRAGMA table_info(order_items)"))
-                existing = {row[1] for row in result.fetchall()}
-                to_add = []
-                if 'seller_id' not in existing:
-                    to_add.append("ALTER TABLE order_items ADD COLUMN seller_id INTEGER")
-                if 'status' not in existing:
-                    to_add.append("ALTER TABLE order_items ADD COLUMN status TEXT DEFAULT 'Pending'")
-                if 'rejection_reason' not in existing:
-                    to_add.append("ALTER TABLE order_items ADD COLUMN rejection_reason TEXT")
-                for stmt in to_add:
-                    try:
-                        conn.execute(text(stmt))
-                        logger.info(f"Added column to order_items table: {stmt}")
-                    except Exception as e:
-                        logger.warning(f"Failed to add column to order_items: {e}")
-                
-                # Create index on seller_id if column was added
-                if 'seller_id' not in existing:
-                    try:
-                        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_order_items_seller_id ON order_items(seller_id)"))
-                    except Exception:
-                        pass
-                if 'status' not in existing:
-                    try:
-                        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_order_items_status ON order_items(status)"))
-                    except Exception:
-                        pass
-            
-            # Check if orders table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='orders'"))
-            if not result.fetchone():
-                logger.info("orders table does not exist yet, will be created by Base.metadata.create_all()")
-            else:
-                # discover existing columns in orders
-                result = conn.execute(text("PRAGMA table_info(orders)"))
-                existing = {row[1] for row in result.fetchall()}
-                to_add = []
-                if 'ship_name' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_name TEXT")
-                if 'ship_phone' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_phone TEXT")
-                if 'ship_address_line1' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_address_line1 TEXT")
-                if 'ship_address_line2' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_address_line2 TEXT")
-                if 'ship_city' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_city TEXT")
-                if 'ship_state' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_state TEXT")
-                if 'ship_country' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_country TEXT")
-                if 'ship_pincode' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ship_pincode TEXT")
-                if 'ordered_at' not in existing:
-                    to_add.append("ALTER TABLE orders ADD COLUMN ordered_at DATETIME")
-                for stmt in to_add:
-                    try:
-                        conn.execute(text(stmt))
-                        logger.info(f"Added column to orders table: {stmt}")
-                    except Exception as e:
-                        logger.warning(f"Failed to add column to orders: {e}")
+                return
+            conn.execute(text("UPDATE products SET gender = LOWER(TRIM(gender)) WHERE gender <> LOWER(TRIM(gender))"))
+            # Unrecognized values become unisex rather than NULL, so they stay in the gendered listings
+            conn.execute(text("UPDATE products SET gender = 'unisex' WHERE gender NOT IN ('men', 'women', 'unisex')"))
+            # Listings filter on verification_status, not is_verified
+            conn.execute(text("DROP INDEX IF EXISTS ix_products_verified_gender"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_approved_gender ON products(verification_status, gender, id)"))
     except Exception as e:
-        logger.exception(f"Migration ensure_order_seller_columns failed: {e}")
-
-ensure_order_seller_columns()
-
-# Migration: Add reset_token and reset_token_expires to users table
-def ensure_reset_token_columns():
+        logger.exception(f"Error during product gender migration: {e}")
+        return False
+
+# Migration: cart indexes. The unique line index is the conflict target for
+# cart upserts and, leading with (user_id, product_id), also serves per-user
+# and per-product lookups; product_id alone serves product deletes.
+def ensure_cart_indexes():
+    line = "user_id, product_id, COALESCE(variant_id, 0), COALESCE(size, ''), COALESCE(color, '')"
     try:
         with engine.begin() as conn:
-            # Check if users table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
+            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='cart_items'"))
             if not result.fetchone():
-                logger.info("Users table does not exist yet, will be created by Base.metadata.create_all()")
                 return
-            
-            # Check existing columns in users table
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            existing = {row[1] for row in result.fetchall()}
-            
-            if 'reset_token' not in existing:
-                conn.execute(text("ALTER TABLE users ADD COLUMN reset_token TEXT"))
-                logger.info("Added reset_token column to users table")
-            
-            if 'reset_token_expires' not in existing:
-                conn.execute(text("ALTER TABLE users ADD COLUMN reset_token_expires DATETIME"))
-                logger.info("Added reset_token_expires column to users table")
-            
-            # Create index on reset_token for faster lookups
-            try:
-                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_users_reset_token ON users(reset_token)"))
-            except Exception:
-                pass  # Index might already exist
+            # Fold duplicate lines into the oldest row, then drop the rest
+            conn.execute(text(
+                "UPDATE cart_items SET quantity = ("
+                "SELECT SUM(dup.quantity) FROM cart_items AS dup "
+                "WHERE dup.user_id = cart_items.user_id AND dup.product_id = cart_items.product_id "
+                "AND COALESCE(dup.variant_id, 0) = COALESCE(cart_items.variant_id, 0) "
+                "AND COALESCE(dup.size, '') = COALESCE(cart_items.size, '') "
+                "AND COALESCE(dup.color, '') = COALESCE(cart_items.color, '')) "
+                f"WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY {line} HAVING COUNT(*) > 1)"
+            ))
+            removed = conn.execute(text(
+                f"DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY {line})"
+            )).rowcount
+            if removed:
+                logger.info(f"Merged {removed} duplicate cart rows")
+            conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_cart_items_line ON cart_items({line})"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cart_items_product_id ON cart_items(product_id)"))
     except Exception as e:
-        logger.exception(f"Error during reset token columns migration: {e}")
-
-ensure_reset_token_columns()
+        logger.exception(f"Error during cart index migration: {e}")
+        return False
 
-# Migration: Add has_address to users, delivery_address to orders, and create addresses table
-def ensure_address_columns():
+# Migration: indexes for per-user order history, order item lookups and
+# seller dashboards. (seller_id, is_verified) replaces the seller_id index.
+def ensure_order_indexes():
     try:
         with engine.begin() as conn:
-            # Check if users table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
-            if not result.fetchone():
-                logger.info("Users table does not exist yet, will be created by Base.metadata.create_all()")
-                return
-            
-            # Check existing columns in users table
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            existing_users = {row[1] for row in result.fetchall()}
-            
-            if 'has_address' not in existing_users:
-                conn.execute(text("ALTER TABLE users ADD COLUMN has_address BOOLEAN DEFAULT 0"))
-                logger.info("Added has_address column to users table")
-            
-            # Check existing columns in orders table
-            result = conn.execute(text("PRAGMA table_info(orders)"))
-            existing_orders = {row[1] for row in result.fetchall()}
-            
-            if 'delivery_address' not in existing_orders:
-                conn.execute(text("ALTER TABLE orders ADD COLUMN delivery_address TEXT"))
-                logger.info("Added delivery_address column to orders table")
-            
-            # Check if addresses table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='addresses'"))
-            if not result.fetchone():
-                logger.info("Addresses table will be created by Base.metadata.create_all()")
+            tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+            if "orders" in tables:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_created ON orders(user_id, created_at)"))
+            if "order_items" in tables:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items(order_id)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_order_items_product_id ON order_items(product_id)"))
+            if "products" in tables:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_seller_verified ON products(seller_id, is_verified)"))
+                conn.execute(text("DROP INDEX IF EXISTS ix_products_seller_id"))
     except Exception as e:
-        logger.exception(f"Error during address columns migration: {e}")
-
-ensure_address_columns()
+        logger.exception(f"Error during order index migration: {e}")
+        return False
 
-# Migration: Add gender and dob to users table
-def ensure_profile_columns():
+# Migration: trigram full-text index over product names for /products/search.
+# An external-content FTS5 table kept in step with products by triggers; the
+# trigram tokenizer matches case-insensitive substrings, as the ILIKE it replaces.
+def ensure_product_search_index():
     try:
         with engine.begin() as conn:
-            # Check if users table exists
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
-            if not result.fetchone():
-                logger.info("Users table does not exist yet, will be created by Base.metadata.create_all()")
-                return
-            
-            # Check existing columns in users table
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            existing = {row[1] for row in result.fetchall()}
-            
-            if 'gender' not in existing:
-                conn.execute(text("ALTER TABLE users ADD COLUMN gender TEXT"))
-                logger.info("Added gender column to users table")
-            
-            if 'dob' not in existing:
-                conn.execute(text("ALTER TABLE users ADD COLUMN dob DATETIME"))
-                logger.info("Added dob column to users table")
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+                "name, content='products', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+                "INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+                "INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN "
+                "INSERT INTO products_fts(products_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+                "INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name); END"
+            ))
+            # Index rows written before the triggers existed
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        if "no such module" not in str(e) and "no such tokenizer" not in str(e):
+            logger.exception(f"Error during product search index migration: {e}")
+            return False
+        # SQLite builds without FTS5/trigram (before 3.34) keep the ILIKE search;
+        # a supported setup, so the schema version is still stamped
+        logger.warning(f"Product search index unavailable, using ILIKE search: {e}")
     except Exception as e:
-        logger.exception(f"Error during profile columns migration: {e}")
+        logger.exception(f"Error during product search index migration: {e}")
+        return False
+
+
+# Stored in SQLite's PRAGMA user_version once every migration has succeeded.
+# Bump it whenever a model or a migration below changes.
+SCHEMA_VERSION = 3
+
+MIGRATIONS = (
+    ensure_schema,  # Columns the index migrations build on
+    ensure_user_login_indexes,
+    ensure_wishlist_unique_index,
+    ensure_product_gender_index,
+    ensure_cart_indexes,
+    ensure_order_indexes,
+    ensure_product_search_index,
+)
+
+def run_migrations():
+    """
+    Create missing tables and bring an existing database up to date.
+    Called once per process from lifespan, before the app serves requests;
+    a database already at SCHEMA_VERSION costs a single PRAGMA read, so
+    extra workers and reloads skip the schema inspection.
+    """
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION:
+            return
+    Base.metadata.create_all(bind=engine)
+    failed = [migration.__name__ for migration in MIGRATIONS if migration() is False]
+    if failed:
+        # Leave the version unset so the next startup retries
+        logger.warning(f"Schema left below version {SCHEMA_VERSION}; failed: {', '.join(failed)}")
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(f"Database schema at version {SCHEMA_VERSION}")
 
-ensure_profile_columns()
 
 # Dependency to get DB session (imported from database.py)
 from database import get_db
 
-# Handle CORS preflight requests
-@app.options("/{full_path:path}")
-async def options_handler(request: Request, full_path: str):
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Max-Age": "3600",
-        }
+# Gender filters for the catalog endpoints, built once at import.
+# Filtering by men or women also includes unisex products.
+_VALID_GENDERS = frozenset({"men", "women", "unisex"})
+
+def listing_gender_key(gender: str | None) -> str:
+    """The _GENDER_FILTER key for a gender query parameter, or "all" when it is missing or unknown"""
+    if not gender:
+        return "all"
+    gender = gender.strip().lower()
+    return gender if gender in _VALID_GENDERS else "all"
+
+# products.gender is stored lowercase (see ensure_product_gender_index)
+_GENDER_FILTER = {
+    "men": ProductModel.gender.in_(("men", "unisex")),
+    "women": ProductModel.gender.in_(("women", "unisex")),
+    "unisex": ProductModel.gender == "unisex",
+}
+
+# Catalog ETags: a version counter bumped after any commit that touches
+# products, variants, images or reviews. The boot token keeps ETags from a
+# previous process (or another worker) from ever matching this one's. The
+# counter only sees this process's commits, so ETags also roll over every
+# CATALOG_ETAG_TTL_SECONDS to pick up writes from other workers, scripts or raw SQL.
+CATALOG_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+CATALOG_ETAG_TTL_SECONDS = 60
+_CATALOG_MODELS = (ProductModel, ProductVariant, ProductImage, Review)
+_CATALOG_BOOT = uuid.uuid4().hex[:8]
+_catalog_version = 0
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_catalog_flush(session, flush_context, instances):
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, _CATALOG_MODELS) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info["catalog_changed"] = True
+            return
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_catalog_bulk(orm_execute_state):
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None:
+        if issubclass(orm_execute_state.bind_mapper.class_, _CATALOG_MODELS):
+            orm_execute_state.session.info["catalog_changed"] = True
+
+# Development guard against N+1 queries: LAZY_LOAD_CHECK=warn logs every
+# relationship lazy load with the attribute that triggered it, and
+# LAZY_LOAD_CHECK=raise fails the request instead. Off by default.
+LAZY_LOAD_CHECK = os.getenv("LAZY_LOAD_CHECK", "").strip().lower()
+
+if LAZY_LOAD_CHECK in ("warn", "raise"):
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def _check_lazy_load(orm_execute_state):
+        if not (orm_execute_state.is_select and orm_execute_state.is_relationship_load):
+            return
+        loaded_from = orm_execute_state.lazy_loaded_from
+        if loaded_from is None:
+            return
+        attribute = f"{loaded_from.class_.__name__}.{orm_execute_state.loader_strategy_path[-1].key}"
+        if LAZY_LOAD_CHECK == "raise":
+            raise RuntimeError(f"Lazy load of {attribute}; load it with selectinload/joinedload")
+        logger.warning(f"Lazy load of {attribute}")
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_catalog_version(session):
+    global _catalog_version
+    if session.info.pop("catalog_changed", False):
+        _catalog_version += 1
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_catalog_change(session):
+    session.info.pop("catalog_changed", None)
+
+def catalog_not_modified(request: Request, response: Response, *key_parts):
+    """Set catalog caching headers; return a 304 response if the client's ETag is current"""
+    epoch = int(time.time() // CATALOG_ETAG_TTL_SECONDS)
+    etag = 'W/"%s"' % "-".join(str(p) for p in (_CATALOG_BOOT, _catalog_version, epoch, *key_parts))
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+    return None
+
+# Public catalog responses (no per-user data), cached as serialized JSON per
+# endpoint + query params. Entries die with the catalog version, or after the
+# TTL for writes made by other workers.
+CATALOG_RESPONSE_TTL_SECONDS = 60
+CATALOG_RESPONSE_CACHE_SIZE = 512
+_catalog_responses: "OrderedDict[tuple, tuple[int, float, bytes]]" = OrderedDict()
+_catalog_responses_lock = threading.Lock()
+
+_PRODUCT_ADAPTER = TypeAdapter(ProductSchema)
+_PRODUCT_LIST_ADAPTER = TypeAdapter(list[ProductSchema])
+_PRODUCT_PAGE_ADAPTER = TypeAdapter(ProductListResponse)
+_CARD_LIST_ADAPTER = TypeAdapter(list[ProductCardSchema])
+_CARD_PAGE_ADAPTER = TypeAdapter(ProductCardListResponse)
+
+# ?view=card on the listings: only the columns ProductCardSchema needs, read as
+# plain rows, so the wide text/JSON columns are neither read nor decoded and no
+# ORM instances are built
+PRODUCT_CARD_COLUMNS = (
+    ProductModel.id, ProductModel.name, ProductModel.description, ProductModel.image_url,
+    ProductModel.price, ProductModel.discounted_price, ProductModel.gender,
+    ProductModel.category, ProductModel.stock, ProductModel.status,
+)
+ProductView = Literal["full", "card"]
+
+def _listing_page_stmt(gender_key: str, keyset: bool, card: bool):
+    stmt = select(*PRODUCT_CARD_COLUMNS) if card else select(ProductModel)
+    stmt = stmt.where(ProductModel.verification_status == "Approved")
+    if gender_key != "all":
+        stmt = stmt.where(_GENDER_FILTER[gender_key])
+    if keyset:
+        stmt = stmt.where(ProductModel.id < bindparam("cursor"))
+    stmt = stmt.order_by(ProductModel.id.desc()).limit(bindparam("limit"))
+    if not keyset:
+        stmt = stmt.offset(bindparam("offset"))
+    return stmt
+
+# /products/paginated statements, built once per (gender, keyset, view) shape
+# with the page values as bound parameters, so each request reuses both the
+# construct and its compiled SQL
+_LISTING_PAGE_STMTS = {
+    (gender_key, keyset, card): _listing_page_stmt(gender_key, keyset, card)
+    for gender_key in ("all", *_GENDER_FILTER)
+    for keyset in (False, True)
+    for card in (False, True)
+}
+_LISTING_COUNT_STMTS = {
+    gender_key: select(func.count(ProductModel.id)).where(
+        ProductModel.verification_status == "Approved",
+        *((_GENDER_FILTER[gender_key],) if gender_key != "all" else ()),
     )
+    for gender_key in ("all", *_GENDER_FILTER)
+}
+
+def prepare_product_cards(rows, db: Session) -> list[dict]:
+    """Build ProductCardSchema dicts from PRODUCT_CARD_COLUMNS rows, loading all their images in one query"""
+    cards = [row._asdict() for row in rows]
+    images_by_product = {card["id"]: [] for card in cards}
+    if images_by_product:
+        images = db.query(ProductImage).filter(
+            ProductImage.product_id.in_(images_by_product)
+        ).order_by(ProductImage.is_primary.desc(), ProductImage.id.asc())
+        for img in images:
+            if img.image_url:
+                img.image_url = normalize_image_url(img.image_url)
+            images_by_product[img.product_id].append(img)
+    for card in cards:
+        if card["image_url"]:
+            card["image_url"] = normalize_image_url(card["image_url"])
+        card["images"] = images_by_product[card["id"]]
+    return cards
+
+def _catalog_json(body: bytes, response: Response | None = None) -> Response:
+    headers = {k: response.headers[k] for k in ("etag", "cache-control") if response and k in response.headers}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def cached_catalog_response(key: tuple, response: Response | None = None):
+    """Return the cached response for a public catalog request, or None on a miss"""
+    with _catalog_responses_lock:
+        entry = _catalog_responses.get(key)
+        if not entry or entry[0] != _catalog_version or entry[1] <= time.monotonic():
+            return None
+        _catalog_responses.move_to_end(key)
+    return _catalog_json(entry[2], response)
+
+def cache_catalog_response(key: tuple, version: int, adapter: TypeAdapter, content, response: Response | None = None) -> Response:
+    """Serialize content through its response schema, cache it under the catalog version read before the query, and return it"""
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), by_alias=True)
+    with _catalog_responses_lock:
+        _catalog_responses[key] = (version, time.monotonic() + CATALOG_RESPONSE_TTL_SECONDS, body)
+        _catalog_responses.move_to_end(key)
+        while len(_catalog_responses) > CATALOG_RESPONSE_CACHE_SIZE:
+            _catalog_responses.popitem(last=False)
+    return _catalog_json(body, response)
+
+# Listing totals only change with the catalog: reuse a count until the catalog
+# version moves, or the TTL runs out (writes made by other workers)
+LISTING_TOTAL_TTL_SECONDS = 60
+_listing_totals: dict[str, tuple[int, float, int]] = {}
+
+def cached_listing_total(key: str, count) -> int:
+    """Return the cached row count for a listing filter, calling count() on a miss"""
+    now = time.monotonic()
+    cached = _listing_totals.get(key)
+    if cached and cached[0] == _catalog_version and cached[1] > now:
+        return cached[2]
+    version = _catalog_version
+    total = count()
+    _listing_totals[key] = (version, now + LISTING_TOTAL_TTL_SECONDS, total)
+    return total
 
 # Create Product (SELLER ONLY - FIXED SECURITY BUG)
 @app.post("/products", response_model=ProductSchema, tags=["Products"])
@@ -935,7 +843,6 @@ def create_product(
     new_product = ProductModel(**product_data)
     db.add(new_product)
     db.commit()
-    db.refresh(new_product)
     normalize_product_gender(new_product, db)
     
     # Send product approval notification
@@ -945,39 +852,41 @@ def create_product(
     return new_product
 
 # Get All Products
-@app.get("/products", response_model=list[ProductSchema], tags=["Products"])
+@app.get("/products", response_model=list[ProductSchema] | list[ProductCardSchema], tags=["Products"])
 def get_products(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    gender: str | None = Query(None, description="Filter by gender: men/women/unisex")
+    gender: str | None = Query(None, description="Filter by gender: men/women/unisex"),
+    view: ProductView = Query("full", description="card: only the fields a listing card shows"),
 ):
+    gender_key = listing_gender_key(gender)
+    not_modified = catalog_not_modified(request, response, "all", gender_key, view)
+    if not_modified:
+        return not_modified
+    cache_key = ("products", gender_key, view)
+    cached = cached_catalog_response(cache_key, response)
+    if cached:
+        return cached
+    version = _catalog_version
     try:
-        query = db.query(ProductModel)
         # Only show approved products to customers
-        query = query.filter(ProductModel.verification_status == "Approved")
+        stmt = select(*PRODUCT_CARD_COLUMNS) if view == "card" else select(ProductModel)
+        stmt = stmt.where(ProductModel.verification_status == "Approved")
         # Only filter by gender if explicitly provided and valid
-        if gender and isinstance(gender, str) and gender.strip() and gender.lower() in ['men', 'women', 'unisex']:
-            gender_lower = gender.lower()
-            # Include unisex products when filtering by men or women
-            if gender_lower == 'men':
-                # Show men products AND unisex products (case-insensitive)
-                query = query.filter(
-                    (func.lower(ProductModel.gender) == 'men') |
-                    (func.lower(ProductModel.gender) == 'unisex')
-                )
-            elif gender_lower == 'women':
-                # Show women products AND unisex products (case-insensitive)
-                query = query.filter(
-                    (func.lower(ProductModel.gender) == 'women') |
-                    (func.lower(ProductModel.gender) == 'unisex')
-                )
-            else:  # unisex
-                # Show only unisex products (case-insensitive)
-                query = query.filter(func.lower(ProductModel.gender) == 'unisex')
+        if gender_key != "all":
+            stmt = stmt.where(_GENDER_FILTER[gender_key])
         # When no gender filter, show ALL verified products
-        items = query.order_by(ProductModel.id.desc()).all()
+        # Stream rows in chunks instead of materializing the whole catalog up front
+        stmt = stmt.order_by(ProductModel.id.desc()).execution_options(yield_per=100)
+        if view == "card":
+            cards = []
+            for partition in db.execute(stmt).partitions():
+                cards.extend(prepare_product_cards(partition, db))
+            return cache_catalog_response(cache_key, version, _CARD_LIST_ADAPTER, cards, response)
         # Normalize gender values to lowercase for Pydantic validation (load variants if needed)
         normalized_items = []
-        for item in items:
+        for item in db.scalars(stmt):
             try:
                 normalized = normalize_product_gender(item, db)
                 normalized_items.append(normalized)
@@ -986,7 +895,7 @@ def get_products(
                 logger.exception(f"Full traceback for product {item.id}")
                 # Skip this product but continue with others
                 continue
-        return normalized_items
+        return cache_catalog_response(cache_key, version, _PRODUCT_LIST_ADAPTER, normalized_items, response)
     except Exception as e:
         logger.exception(f"Failed to fetch products: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch products: {str(e)}")
@@ -1015,12 +924,12 @@ def deserialize_json_field(value):
     return value
 
 def normalize_product_gender(product, db: Session = None):
-    """Normalize product gender to lowercase for Pydantic validation"""
+    """
+    Prepare a product for its response schema: absolute image URLs, decoded
+    JSON columns and loaded variants/images. Gender is already stored
+    lowercase (see ensure_product_gender_index).
+    """
     try:
-        # Normalize gender
-        if hasattr(product, 'gender') and product.gender:
-            product.gender = product.gender.lower() if product.gender.lower() in ['men', 'women', 'unisex'] else None
-
         # Normalize image URL
         if hasattr(product, 'image_url') and product.image_url:
             product.image_url = normalize_image_url(product.image_url)
@@ -1099,6 +1008,24 @@ def normalize_product_gender(product, db: Session = None):
         # Return product as-is if normalization fails (better than crashing)
         return product
 
+def insert_products(db: Session, rows: list[dict]) -> list[ProductModel]:
+    """
+    Insert product rows with one executemany INSERT ... RETURNING and return
+    the new products. They have no variants or images yet, so those are set
+    empty instead of being lazy-loaded per product for the response.
+    """
+    # Bulk inserts bypass the model's validators, so apply their defaults here
+    for row in rows:
+        row["gender"] = normalize_product_gender_value(row.get("gender"))
+        if row.get("category") is None:
+            row["category"] = "general"
+    products = db.scalars(insert(ProductModel).returning(ProductModel), rows).all()
+    for product in products:
+        set_committed_value(product, "variants", [])
+        set_committed_value(product, "images", [])
+        product.product_variants = []
+    return products
+
 def create_notification_sync(
     notification_type: str,
     message: str,
@@ -1129,19 +1056,7 @@ def create_notification_sync(
         db.commit()
         db.refresh(notification)
         
-        # Broadcast to connected clients asynchronously (fire and forget)
-        import asyncio
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # Schedule as background task
-                asyncio.create_task(broadcast_notification(notification))
-            else:
-                # Run in new event loop
-                asyncio.run(broadcast_notification(notification))
-        except RuntimeError:
-            # No event loop, create one
-            asyncio.run(broadcast_notification(notification))
+        broadcast_notification_sync(notification)
         
         logger.info(f"Notification created: {notification_type} - {message}")
         return notification
@@ -1150,6 +1065,21 @@ def create_notification_sync(
         db.rollback()
         return None
 
+def broadcast_notification_sync(notification: Notification):
+    """Broadcast a committed notification to WebSocket clients (fire and forget)"""
+    import asyncio
+    try:
+        loop = asyncio.get_event_loop()
+        if loop.is_running():
+            # Schedule as background task
+            asyncio.create_task(broadcast_notification(notification))
+        else:
+            # Run in new event loop
+            asyncio.run(broadcast_notification(notification))
+    except RuntimeError:
+        # No event loop, create one
+        asyncio.run(broadcast_notification(notification))
+
 async def broadcast_notification(notification: Notification):
     """Broadcast notification to WebSocket clients"""
     notification_data = {
@@ -1225,96 +1155,123 @@ def update_product_status(product: ProductModel, db: Session):
             logger.error(f"Error creating stock notification: {e}")
 
 
-@app.get("/products/paginated", response_model=ProductListResponse, tags=["Products"])
+@app.get("/products/paginated", response_model=ProductListResponse | ProductCardListResponse, tags=["Products"])
 def get_products_paginated(
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(12, ge=1, le=60),
     gender: str | None = Query(None, description="Filter by gender: men/women/unisex"),
+    cursor: int | None = Query(None, description="next_cursor from the previous page; takes precedence over page"),
+    view: ProductView = Query("full", description="card: only the fields a listing card shows"),
     db: Session = Depends(get_db)
 ):
+    gender_key = listing_gender_key(gender)
+    not_modified = catalog_not_modified(request, response, page, page_size, gender_key, cursor or "", view)
+    if not_modified:
+        return not_modified
+    cache_key = ("paginated", page, page_size, gender_key, cursor, view)
+    cached = cached_catalog_response(cache_key, response)
+    if cached:
+        return cached
+    version = _catalog_version
     try:
-        base = db.query(ProductModel)
-        # Only show approved products to customers
-        base = base.filter(ProductModel.verification_status == "Approved")
-        # Only filter by gender if explicitly provided and not empty
-        if gender and isinstance(gender, str) and gender.strip() and gender.lower() in ['men', 'women', 'unisex']:
-            gender_lower = gender.lower()
-            # Include unisex products when filtering by men or women
-            if gender_lower == 'men':
-                # Show men products AND unisex products (case-insensitive)
-                base = base.filter(
-                    (func.lower(ProductModel.gender) == 'men') |
-                    (func.lower(ProductModel.gender) == 'unisex')
-                )
-            elif gender_lower == 'women':
-                # Show women products AND unisex products (case-insensitive)
-                base = base.filter(
-                    (func.lower(ProductModel.gender) == 'women') |
-                    (func.lower(ProductModel.gender) == 'unisex')
-                )
-            else:  # unisex
-                # Show only unisex products (case-insensitive)
-                base = base.filter(func.lower(ProductModel.gender) == 'unisex')
-        # When no gender filter, show ALL verified products regardless of gender value
-        total = base.count()
+        # Only approved products are shown; filter by gender only if explicitly
+        # provided and valid, otherwise show ALL approved products
+        total = cached_listing_total(gender_key, lambda: db.scalar(_LISTING_COUNT_STMTS[gender_key]))
         logger.info(f"Fetching products: page={page}, page_size={page_size}, gender={gender}, total={total}")
-        offset = (page - 1) * page_size
-        items = base.order_by(ProductModel.id.desc()).limit(page_size).offset(offset).all()
-        # Normalize gender values to lowercase for Pydantic validation (load variants if needed)
-        items = [normalize_product_gender(item, db) for item in items]
+        # Keyset pagination (cursor) seeks past the last id seen instead of skipping rows
+        keyset = cursor is not None
+        params = {"limit": page_size}
+        if keyset:
+            params["cursor"] = cursor
+        else:
+            params["offset"] = (page - 1) * page_size
+        items = db.execute(_LISTING_PAGE_STMTS[gender_key, keyset, view == "card"], params)
+        items = items.all() if view == "card" else items.scalars().all()
+        next_cursor = items[-1].id if len(items) == page_size else None
         logger.info(f"Returning {len(items)} products")
-        return {"items": items, "total": total, "page": page, "page_size": page_size}
+        if view == "card":
+            items = prepare_product_cards(items, db)
+            adapter = _CARD_PAGE_ADAPTER
+        else:
+            # Normalize gender values to lowercase for Pydantic validation (load variants if needed)
+            items = [normalize_product_gender(item, db) for item in items]
+            adapter = _PRODUCT_PAGE_ADAPTER
+        result = {"items": items, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
+        return cache_catalog_response(cache_key, version, adapter, result, response)
     except Exception as e:
         logger.exception("Failed to fetch paginated products")
         raise HTTPException(status_code=500, detail=f"Failed to fetch products: {str(e)}")
 
-@app.get("/products/search", response_model=list[ProductSchema], tags=["Products"])
+# Whether the products_fts index exists, checked once per process
+_products_fts_ready: bool | None = None
+
+def product_name_filter(name: str, db: Session):
+    """Substring match on product name, through the trigram index when it can serve it"""
+    global _products_fts_ready
+    if _products_fts_ready is None:
+        _products_fts_ready = db.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        ) is not None
+    # Trigrams need at least three characters to match on
+    if not _products_fts_ready or len(name) < 3:
+        return ProductModel.name.ilike(f"%{name}%")
+    phrase = '"%s"' % name.replace('"', '""')
+    return ProductModel.id.in_(
+        text("SELECT rowid FROM products_fts WHERE products_fts MATCH :name_phrase")
+        .bindparams(name_phrase=phrase)
+        .columns(ProductModel.id)
+    )
+
+@app.get("/products/search", response_model=list[ProductSchema] | list[ProductCardSchema], tags=["Products"])
 def search_products(
     name: str | None = Query(None, description="Search by name"),
     min_price: float | None = Query(None, description="Minimum price"),
     max_price: float | None = Query(None, description="Maximum price"),
     gender: str | None = Query(None, description="Filter by gender: men/women/unisex"),
+    view: ProductView = Query("full", description="card: only the fields a listing card shows"),
     db: Session = Depends(get_db)
 ):
+    gender_key = listing_gender_key(gender)
+    cache_key = ("search", name, min_price, max_price, gender_key, view)
+    cached = cached_catalog_response(cache_key)
+    if cached:
+        return cached
+    version = _catalog_version
     query = db.query(ProductModel)
     # Only show approved products to customers
     query = query.filter(ProductModel.verification_status == "Approved")
 
     if name:
-        query = query.filter(ProductModel.name.ilike(f"%{name}%"))
+        query = query.filter(product_name_filter(name, db))
     if min_price is not None:
         query = query.filter(ProductModel.price >= min_price)
     if max_price is not None:
         query = query.filter(ProductModel.price <= max_price)
     # Only filter by gender if explicitly provided and valid
-    if gender and isinstance(gender, str) and gender.strip() and gender.lower() in ['men', 'women', 'unisex']:
-        gender_lower = gender.lower()
-        # Include unisex products when filtering by men or women
-        if gender_lower == 'men':
-            # Show men products AND unisex products
-            query = query.filter(
-                (ProductModel.gender.in_(['men', 'Men', 'MEN'])) |
-                (ProductModel.gender.in_(['unisex', 'Unisex', 'UNISEX']))
-            )
-        elif gender_lower == 'women':
-            # Show women products AND unisex products
-            query = query.filter(
-                (ProductModel.gender.in_(['women', 'Women', 'WOMEN'])) |
-                (ProductModel.gender.in_(['unisex', 'Unisex', 'UNISEX']))
-            )
-        else:  # unisex
-            # Show only unisex products
-            query = query.filter(
-                ProductModel.gender.in_(['unisex', 'Unisex', 'UNISEX'])
-            )
+    if gender_key != "all":
+        query = query.filter(_GENDER_FILTER[gender_key])
+
+    if view == "card":
+        results = query.with_entities(*PRODUCT_CARD_COLUMNS).order_by(ProductModel.id.desc()).all()
+        return cache_catalog_response(cache_key, version, _CARD_LIST_ADAPTER, prepare_product_cards(results, db))
 
     results = query.order_by(ProductModel.id.desc()).all()
     # Normalize gender values to lowercase for Pydantic validation (load variants if needed)
     results = [normalize_product_gender(item, db) for item in results]
-    return results
+    return cache_catalog_response(cache_key, version, _PRODUCT_LIST_ADAPTER, results)
 
 @app.get("/products/{product_id}", response_model=ProductSchema, tags=["Products"])
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    not_modified = catalog_not_modified(request, response, "product", product_id)
+    if not_modified:
+        return not_modified
+    cache_key = ("product", product_id)
+    cached = cached_catalog_response(cache_key, response)
+    if cached:
+        return cached
+    version = _catalog_version
     product = db.query(ProductModel).filter(
         ProductModel.id == product_id,
         ProductModel.verification_status == "Approved"
@@ -1334,7 +1291,7 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     
     # Normalize gender value to lowercase for Pydantic validation (this will also load variants)
     normalize_product_gender(product, db)
-    return product
+    return cache_catalog_response(cache_key, version, _PRODUCT_ADAPTER, product, response)
 
 # Get Product Reviews
 @app.get("/products/{product_id}/reviews", response_model=list[ReviewResponse], tags=["Products"])
@@ -1382,10 +1339,12 @@ def create_product_review(
     user = current_user_obj
     
     # Check if user already reviewed this product
-    existing_review = db.query(Review).filter(
-        Review.product_id == product_id,
-        Review.user_id == user.id
-    ).first()
+    existing_review = db.query(
+        db.query(Review.id).filter(
+            Review.product_id == product_id,
+            Review.user_id == user.id
+        ).exists()
+    ).scalar()
     if existing_review:
         raise HTTPException(status_code=400, detail="You have already reviewed this product")
     
@@ -1466,20 +1425,109 @@ def delete_product(
     current_admin: User = Depends(require_admin)
 ):
     """Delete a product (Admin only)"""
-    product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
-    if not product:
+    # SQLite foreign keys are not enforced here, so there is no ON DELETE
+    # CASCADE: clear the rows referencing the product with one DELETE per
+    # table instead of loading each collection, then the product itself
+    for model in (CartItem, WishlistItem, Review, ProductVariant, ProductImage):
+        db.execute(delete(model).where(model.product_id == product_id))
+    if db.execute(delete(ProductModel).where(ProductModel.id == product_id)).rowcount == 0:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Product not found")
-
-    # Remove related cart items referencing this product to avoid FK issues
-    db.query(CartItem).filter(CartItem.product_id == product_id).delete()
-
-    db.delete(product)
     db.commit()
     return {"message": "Product deleted successfully"}
 
+def find_registration_conflict(db: Session, username: str, email: str, phone: str | None = None):
+    """
+    Check username, email and phone uniqueness in one query.
+    Returns the first conflicting field ("username", "email" or "phone"), or None.
+    """
+    conditions = [User.username == username, User.email == email]
+    if phone:
+        conditions.append(User.phone == phone)
+    taken = db.query(User.username, User.email, User.phone).filter(or_(*conditions)).all()
+    for field, value in (("username", username), ("email", email), ("phone", phone)):
+        if value and any(getattr(row, field) == value for row in taken):
+            return field
+    return None
+
+def normalize_phone(phone: str | None) -> str | None:
+    """Treat empty or blank phone numbers as None"""
+    if phone is None:
+        return None
+    return phone.strip() or None
+
+def ensure_registration_available(db: Session, context: str, username: str, email: str, phone: str | None = None):
+    """Raise a 400 if the username, email or phone is already registered"""
+    conflict = find_registration_conflict(db, username, email, phone)
+    if conflict:
+        logger.info("%s rejected: %s already exists", context, conflict)
+        raise HTTPException(status_code=400, detail=f"{conflict.capitalize()} already registered")
+
+def create_pending_account(db: Session, background_tasks: BackgroundTasks, context: str, **fields) -> User:
+    """
+    Insert an inactive account (active after OTP verification) and email its
+    OTP after the response; a failed send doesn't fail the registration.
+    A concurrent registration that wins the unique index race maps to a 400.
+    """
+    account = User(is_active=False, **fields)
+    otp = issue_otp(account)
+    db.add(account)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        # Best-effort mapping of constraint failures to user-friendly messages
+        message = "Duplicate value for a unique field"
+        detail = str(e.orig).lower() if hasattr(e, 'orig') else str(e).lower()
+        logger.warning("IntegrityError on %s: %s", context.lower(), detail)
+        if 'username' in detail:
+            message = 'Username already registered'
+        elif 'email' in detail:
+            message = 'Email already registered'
+        elif 'phone' in detail:
+            message = 'Phone already registered'
+        raise HTTPException(status_code=400, detail=message)
+
+    background_tasks.add_task(send_otp_email_background, account.email, otp)
+    logger.info("%s success: user_id=%s username=%s", context, account.id, account.username)
+    return account
+
 # Register User (OTP-enabled)
+async def send_otp_email_background(to_email: str, otp: str):
+    """Send an OTP email from a background task, logging failures instead of raising"""
+    try:
+        await send_otp_email_async(to_email, otp)
+        logger.info("OTP sent to email: %s", to_email)
+    except ValueError as e:
+        # Email configuration error - the user can request a resend
+        logger.error("Email configuration error: %s", str(e))
+        logger.warning("OTP email not sent to %s. User can request resend.", to_email)
+    except Exception as e:
+        logger.exception("Failed to send OTP email to %s: %s", to_email, str(e))
+
+async def send_email_background(send, to_email: str, *args):
+    """Run an email_utils sender from a background task, logging failures instead of raising"""
+    try:
+        await send_email_async(send, to_email, *args)
+        logger.info("Email (%s) sent to: %s", send.__name__, to_email)
+    except ValueError as e:
+        logger.error("Email configuration error: %s", str(e))
+    except Exception as e:
+        logger.exception("Failed to send email (%s) to %s: %s", send.__name__, to_email, str(e))
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+def check_registration_rate(request: Request) -> None:
+    """Reject a client that has made SIGNUP_IP_LIMIT signup attempts this window (successful or not), before any hashing"""
+    if not allow_attempt(f"signup-ip:{client_ip(request)}", SIGNUP_IP_LIMIT, SIGNUP_WINDOW_SECONDS):
+        raise HTTPException(status_code=429, detail="Too many registrations from this address. Please try again later.")
+
 @app.post("/users/signup", tags=["Users"])
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    # Async only to await the bcrypt process pool; the session and the rate
+    # limiter are synchronous, so they run in the threadpool
+    await run_in_threadpool(check_registration_rate, request)
     logger.info("Signup attempt: username=%s email=%s phone_present=%s", user.username, user.email, bool(user.phone))
     try:
         # Validate username and password BEFORE checking uniqueness
@@ -1490,86 +1538,54 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
             logger.info("Signup rejected: validation failed: %s", str(e))
             raise HTTPException(status_code=400, detail=str(e))
         
-        # Normalize phone: treat empty strings as None
-        normalized_phone = None
-        if user.phone is not None:
-            stripped = user.phone.strip()
-            if stripped:
-                normalized_phone = stripped
-
-        # Ensure unique username/email/phone
-        if db.query(User).filter(User.username == user.username).first():
-            logger.info("Signup rejected: username already exists: %s", user.username)
-            raise HTTPException(status_code=400, detail="Username already registered")
-        if db.query(User).filter(User.email == user.email).first():
-            logger.info("Signup rejected: email already exists: %s", user.email)
-            raise HTTPException(status_code=400, detail="Email already registered")
-        if normalized_phone and db.query(User).filter(User.phone == normalized_phone).first():
-            logger.info("Signup rejected: phone already exists: %s", normalized_phone)
-            raise HTTPException(status_code=400, detail="Phone already registered")
-
-        # Generate OTP for email verification
-        otp = generate_otp()
-        expiry = datetime.utcnow() + timedelta(minutes=10)
-        hashed_pw = hash_password(user.password)
-        
-        # Create user with is_active=False (will be True after OTP verification)
+        phone = normalize_phone(user.phone)
+        await run_in_threadpool(ensure_registration_available, db, "Signup", user.username, user.email, phone)
+        hashed_pw = await hash_password_async(user.password)
+
         # Customers don't need approval - will be auto-approved on OTP verification
-        new_user = User(
-            username=user.username, 
-            email=user.email, 
-            phone=normalized_phone, 
+        await run_in_threadpool(
+            create_pending_account,
+            db, background_tasks, "Signup",
+            username=user.username,
+            email=user.email,
+            phone=phone,
             hashed_password=hashed_pw,
-            is_active=False,  # Default to False, will be True after OTP verification
-            otp=otp,
-            otp_expiry=expiry,
             role="customer",  # Default role for regular signup
             is_approved=False  # Will be set to True on OTP verification
         )
-        db.add(new_user)
-        try:
-            db.commit()
-        except IntegrityError as e:
-            db.rollback()
-            # Best-effort mapping of constraint failures to user-friendly messages
-            message = "Duplicate value for a unique field"
-            detail = str(e.orig).lower() if hasattr(e, 'orig') else str(e).lower()
-            logger.warning("IntegrityError on signup: %s", detail)
-            if 'username' in detail:
-                message = 'Username already registered'
-            elif 'email' in detail:
-                message = 'Email already registered'
-            elif 'phone' in detail:
-                message = 'Phone already registered'
-            raise HTTPException(status_code=400, detail=message)
-
-        db.refresh(new_user)
-        
-        # Send OTP email
-        try:
-            send_otp_email(user.email, otp)
-            logger.info("OTP sent to email: %s", user.email)
-        except ValueError as e:
-            # Email configuration error - log but don't fail signup
-            logger.error("Email configuration error: %s", str(e))
-            logger.warning("User created but OTP email not sent. User can request resend.")
-        except Exception as e:
-            logger.exception("Failed to send OTP email to %s: %s", user.email, str(e))
-            # Don't fail the signup if email fails, but log it
-            # The user can request a resend if needed
-
-        logger.info("Signup success: user_id=%s username=%s", new_user.id, new_user.username)
         return {"message": "User created successfully. Please verify your email with the OTP sent to your inbox."}
     except HTTPException:
         raise
     except Exception as e:
         logger.exception("Unexpected error during signup: %s", str(e))
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=500, detail=f"Signup failed due to server error: {str(e)}")
 
+def find_login_user(db: Session, request: Request, identifier: str) -> User | None:
+    """Apply the login rate limits, then look the account up by username, email or phone"""
+    # Throttle before the lookup and bcrypt, per account and per client
+    if not (
+        allow_attempt(f"login:{identifier}", LOGIN_ATTEMPT_LIMIT, LOGIN_WINDOW_SECONDS)
+        and allow_attempt(f"login-ip:{client_ip(request)}", LOGIN_IP_LIMIT, LOGIN_WINDOW_SECONDS)
+    ):
+        raise HTTPException(status_code=429, detail="Too many login attempts. Please try again in a minute.")
+    # Pick the column from the identifier's shape so the lookup is a single
+    # index seek: usernames can't contain "@" and must start with a letter
+    if "@" in identifier:
+        return db.query(User).filter(User.email == identifier).first()
+    if identifier[:1].isalpha():
+        return db.query(User).filter(User.username == identifier).first()
+    # Phone number, or a legacy username from before validation
+    return (
+        db.query(User).filter(User.phone == identifier)
+        .union_all(db.query(User).filter(User.username == identifier))
+        .first()
+    )
+
 # Login User (flexible - accepts form data)
 @app.post("/users/login", tags=["Auth"])
-def login_user(
+async def login_user(
+    request: Request,
     username: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(get_db)
@@ -1579,14 +1595,9 @@ def login_user(
     For curl: use -d 'username=test123&password=test@123Q'
     """
     identifier = username  # may be username, email, or phone
-    user = (
-        db.query(User)
-        .filter(
-            (User.username == identifier) | (User.email == identifier) | (User.phone == identifier)
-        )
-        .first()
-    )
-    if not user or not verify_password(password, user.hashed_password):
+    # Async only to await bcrypt; the lookup runs in the threadpool
+    user = await run_in_threadpool(find_login_user, db, request, identifier)
+    if not user or not await verify_login_password(identifier, password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     # Check if user is active (OTP verified)
@@ -1619,6 +1630,7 @@ def login_user(
     access_token_expires = timedelta(minutes=30)
     token_data = {
         "sub": user.username,
+        "uid": user.id,
         "role": user_role,
         "is_seller": is_seller,
         "is_admin": is_admin,
@@ -1655,15 +1667,13 @@ def get_seller_status(
     - Returns is_approved flag, username, and seller_id for authenticated sellers.
     - Uses require_seller() to allow both approved and unapproved sellers.
     """
-    refreshed = db.query(User).filter(User.id == current_user_obj.id).first()
-    if not refreshed:
-        raise HTTPException(status_code=404, detail="User not found")
-
+    # require_seller loaded the user in this request's session, so it is
+    # already current; no second lookup
     return {
-        "is_approved": bool(getattr(refreshed, "is_approved", False)),
-        "username": refreshed.username,
-        "seller_id": refreshed.id,
-        "email": refreshed.email,
+        "is_approved": bool(getattr(current_user_obj, "is_approved", False)),
+        "username": current_user_obj.username,
+        "seller_id": current_user_obj.id,
+        "email": current_user_obj.email,
     }
 
 @app.get("/profile", tags=["Users"])
@@ -1698,7 +1708,9 @@ def update_profile(
         if new_username != user.username:
             validate_username(new_username)
             # Check if username already exists
-            existing = db.query(User).filter(User.username == new_username).first()
+            existing = db.query(
+                db.query(User.id).filter(User.username == new_username).exists()
+            ).scalar()
             if existing:
                 raise HTTPException(status_code=400, detail="Username already taken")
             update_data['username'] = new_username
@@ -1710,10 +1722,12 @@ def update_profile(
             phone = phone.strip()
             if phone:
                 # Check if phone already exists for another user
-                existing = db.query(User).filter(
-                    User.phone == phone,
-                    User.id != user.id
-                ).first()
+                existing = db.query(
+                    db.query(User.id).filter(
+                        User.phone == phone,
+                        User.id != user.id
+                    ).exists()
+                ).scalar()
                 if existing:
                     raise HTTPException(status_code=400, detail="Phone number already registered")
                 update_data['phone'] = phone
@@ -1769,75 +1783,25 @@ def change_password(
 
 # Seller Registration (separate from customer signup)
 @app.post("/users/register-seller", tags=["Users"])
-def register_seller(seller: SellerCreate, db: Session = Depends(get_db)):
+def register_seller(seller: SellerCreate, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    check_registration_rate(request)
     logger.info("Seller registration attempt: username=%s email=%s", seller.username, seller.email)
     try:
-        # Normalize phone: treat empty strings as None
-        normalized_phone = None
-        if seller.phone is not None:
-            stripped = seller.phone.strip()
-            if stripped:
-                normalized_phone = stripped
-
-        # Ensure unique username/email/phone
-        if db.query(User).filter(User.username == seller.username).first():
-            logger.info("Seller registration rejected: username already exists: %s", seller.username)
-            raise HTTPException(status_code=400, detail="Username already registered")
-        if db.query(User).filter(User.email == seller.email).first():
-            logger.info("Seller registration rejected: email already exists: %s", seller.email)
-            raise HTTPException(status_code=400, detail="Email already registered")
-        if normalized_phone and db.query(User).filter(User.phone == normalized_phone).first():
-            logger.info("Seller registration rejected: phone already exists: %s", normalized_phone)
-            raise HTTPException(status_code=400, detail="Phone already registered")
-
-        # Generate OTP for email verification
-        otp = generate_otp()
-        expiry = datetime.utcnow() + timedelta(minutes=10)
+        phone = normalize_phone(seller.phone)
+        ensure_registration_available(db, "Seller registration", seller.username, seller.email, phone)
         hashed_pw = hash_password(seller.password)
-        
-        # Create seller user with role="seller", is_seller=True, and is_approved=False
-        new_seller = User(
-            username=seller.username, 
-            email=seller.email, 
-            phone=normalized_phone, 
+
+        new_seller = create_pending_account(
+            db, background_tasks, "Seller registration",
+            username=seller.username,
+            email=seller.email,
+            phone=phone,
             hashed_password=hashed_pw,
-            is_active=False,  # Will be True after OTP verification
-            otp=otp,
-            otp_expiry=expiry,
             role="seller",  # Seller role
             is_seller=True,  # Boolean flag for seller role
             is_approved=False  # Must be approved by admin
         )
-        db.add(new_seller)
-        try:
-            db.commit()
-        except IntegrityError as e:
-            db.rollback()
-            message = "Duplicate value for a unique field"
-            detail = str(e.orig).lower() if hasattr(e, 'orig') else str(e).lower()
-            logger.warning("IntegrityError on seller registration: %s", detail)
-            if 'username' in detail:
-                message = 'Username already registered'
-            elif 'email' in detail:
-                message = 'Email already registered'
-            elif 'phone' in detail:
-                message = 'Phone already registered'
-            raise HTTPException(status_code=400, detail=message)
-
-        db.refresh(new_seller)
-        
-        # Send OTP email
-        try:
-            send_otp_email(seller.email, otp)
-            logger.info("OTP sent to seller email: %s", seller.email)
-        except ValueError as e:
-            logger.error("Email configuration error: %s", str(e))
-            logger.warning("Seller created but OTP email not sent. Seller can request resend.")
-        except Exception as e:
-            logger.exception("Failed to send OTP email to %s: %s", seller.email, str(e))
 
-        logger.info("Seller registration success: user_id=%s username=%s", new_seller.id, new_seller.username)
-        
         # Send seller verification notification
         message = f"New seller registration: {new_seller.username} ({new_seller.email})"
         create_notification_sync("seller_verification", message, db, seller_id=new_seller.id)
@@ -1850,11 +1814,32 @@ def register_seller(seller: SellerCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Seller registration failed due to server error: {str(e)}")
 
+# Conflict target for cart upserts: the expressions of ux_cart_items_line
+_CART_LINE_KEY = next(ix for ix in CartItem.__table__.indexes if ix.name == "ux_cart_items_line").expressions
+
+def upsert_cart_line(db: Session, **values) -> CartItem:
+    """
+    INSERT a cart line, or add its quantity to the matching existing line,
+    with a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING.
+    The caller commits the session.
+    """
+    stmt = sqlite_insert(CartItem).values(**values)
+    return db.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=_CART_LINE_KEY,
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+        )
+        .returning(CartItem)
+        # Refresh the line if it is already in the session
+        .execution_options(populate_existing=True)
+    ).one()
+
+
 @app.post("/cart/add", response_model=CartItemResponse, tags=["Cart"])
 def add_to_cart(
     item: CartItemCreate,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
     # Use authenticated customer
     user = current_user_obj
@@ -1899,62 +1884,36 @@ def add_to_cart(
         
         item_price = product.price
 
-    # Check if product with same variant already in cart
-    if has_variants:
-        cart_item = (
-            db.query(CartItem)
-            .filter(
-                CartItem.user_id == user.id,
-                CartItem.product_id == item.product_id,
-                CartItem.variant_id == item.variant_id
-            )
-            .first()
-        )
-    else:
-        # Legacy: check by size/color
-        cart_item = (
-            db.query(CartItem)
-            .filter(
-                CartItem.user_id == user.id,
-                CartItem.product_id == item.product_id,
-                CartItem.size == item.size,
-                CartItem.color == item.color
-            )
-            .first()
-        )
-
-    if cart_item:
-        cart_item.quantity += item.quantity
-    else:
-        cart_item = CartItem(
-            user_id=user.id,
-            product_id=item.product_id,
-            variant_id=item.variant_id if has_variants else None,
-            quantity=item.quantity,
-            size=item.size if not has_variants else None,
-            color=item.color if not has_variants else None
-        )
-        db.add(cart_item)
-
+    # Insert the line, or add to the existing line's quantity, in one statement
+    cart_item = upsert_cart_line(
+        db,
+        user_id=user.id,
+        product_id=item.product_id,
+        variant_id=item.variant_id if has_variants else None,
+        quantity=item.quantity,
+        size=item.size if not has_variants else None,
+        color=item.color if not has_variants else None
+    )
     db.commit()
-    db.refresh(cart_item)
-    # Load variant for response
-    if cart_item.variant_id:
-        cart_item.variant = db.query(ProductVariant).filter(ProductVariant.id == cart_item.variant_id).first()
+    # Variant for the response was already loaded while validating
+    if has_variants:
+        set_committed_value(cart_item, "variant", variant)
     return cart_item
 
 
 @app.get("/cart", response_model=list[CartItemResponse], tags=["Cart"])
 def get_cart(
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_claims)
 ):
     """Get user's cart with variant information"""
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user_obj.id).all()
-    # Load variants for each cart item
-    for item in cart_items:
-        if item.variant_id:
-            item.variant = db.query(ProductVariant).filter(ProductVariant.id == item.variant_id).first()
+    # Load variants for all cart items in one batched query
+    cart_items = (
+        db.query(CartItem)
+        .options(selectinload(CartItem.variant))
+        .filter(CartItem.user_id == current_user_obj.id)
+        .all()
+    )
     return cart_items
 
 
@@ -1962,7 +1921,7 @@ def get_cart(
 def remove_from_cart(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
     cart_item = (
         db.query(CartItem)
@@ -1980,7 +1939,7 @@ def remove_from_cart(
 @app.delete("/cart/clear", tags=["Cart"])
 def clear_cart(
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
     db.query(CartItem).filter(CartItem.user_id == current_user_obj.id).delete()
     db.commit()
@@ -1992,7 +1951,7 @@ def clear_cart(
 def set_cart_item_quantity(
     update: CartItemQuantityUpdate,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
     cart_item = (
         db.query(CartItem)
@@ -2007,37 +1966,45 @@ def set_cart_item_quantity(
         # If quantity is set to 0 or less, remove item
         db.delete(cart_item)
         db.commit()
-        # Return a minimal response indicating removal
-        raise HTTPException(status_code=200, detail="Item removed from cart")
+        # Return a minimal response indicating removal (not a CartItemResponse)
+        return JSONResponse(content={"message": "Item removed from cart"})
 
     cart_item.quantity = update.quantity
     db.commit()
-    db.refresh(cart_item)
     return cart_item
 
 
+def cart_item_id_subquery(user_id: int, product_id: int):
+    """Id of the user's first cart row for a product, for single-statement updates"""
+    return (
+        select(CartItem.id)
+        .where(CartItem.user_id == user_id, CartItem.product_id == product_id)
+        .order_by(CartItem.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
 # Increase quantity by 1
 @app.post("/cart/increase/{product_id}", response_model=CartItemResponse, tags=["Cart"])
 def increase_cart_item(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
-    cart_item = (
-        db.query(CartItem)
-        .filter(CartItem.user_id == current_user_obj.id, CartItem.product_id == product_id)
-        .first()
-    )
+    # Increment in a single UPDATE ... RETURNING so concurrent clicks can't lose updates
+    cart_item = db.scalars(
+        update(CartItem)
+        .where(CartItem.id == cart_item_id_subquery(current_user_obj.id, product_id))
+        .values(quantity=CartItem.quantity + 1)
+        .returning(CartItem)
+    ).first()
 
     if not cart_item:
-        # If not present, add with quantity 1
-        cart_item = CartItem(user_id=current_user_obj.id, product_id=product_id, quantity=1)
-        db.add(cart_item)
-    else:
-        cart_item.quantity += 1
+        # If not present, add with quantity 1; a concurrent insert of the same
+        # line is folded in rather than duplicated
+        cart_item = upsert_cart_line(db, user_id=current_user_obj.id, product_id=product_id, quantity=1)
 
     db.commit()
-    db.refresh(cart_item)
     return cart_item
 
 
@@ -2046,27 +2013,27 @@ def increase_cart_item(
 def decrease_cart_item(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user_obj: AuthedUser = Depends(require_customer_writer)
 ):
-    cart_item = (
-        db.query(CartItem)
-        .filter(CartItem.user_id == current_user_obj.id, CartItem.product_id == product_id)
-        .first()
-    )
-
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Item not in cart")
-
-    if cart_item.quantity <= 1:
-        db.delete(cart_item)
+    cart_item_id = cart_item_id_subquery(current_user_obj.id, product_id)
+    # Decrement atomically while more than one remains
+    cart_item = db.scalars(
+        update(CartItem)
+        .where(CartItem.id == cart_item_id, CartItem.quantity > 1)
+        .values(quantity=CartItem.quantity - 1)
+        .returning(CartItem)
+    ).first()
+    if cart_item:
         db.commit()
-        # Similar to above, indicate removal
-        raise HTTPException(status_code=200, detail="Item removed from cart")
+        return cart_item
 
-    cart_item.quantity -= 1
+    # Otherwise the last unit is being removed
+    removed = db.execute(delete(CartItem).where(CartItem.id == cart_item_id).returning(CartItem.id)).first()
+    if not removed:
+        raise HTTPException(status_code=404, detail="Item not in cart")
     db.commit()
-    db.refresh(cart_item)
-    return cart_item
+    # Similar to above, indicate removal
+    return JSONResponse(content={"message": "Item removed from cart"})
 
 # ---------------- Create Order (checkout) ----------------
 @app.post("/orders/create", response_model=OrderResponse, tags=["Orders"])
@@ -2106,8 +2073,15 @@ def create_order(
                 detail="No default address found. Please select an address."
             )
 
-    # fetch cart items for user
-    cart_items = db.query(CartItem).filter(CartItem.user_id == user.id).all()
+    # Take the user's cart lines with one DELETE ... RETURNING, loading their
+    # products and variants in two batched queries. Nothing is committed
+    # unless the order is, so a failed checkout leaves the cart as it was.
+    cart_items = db.scalars(
+        delete(CartItem)
+        .where(CartItem.user_id == user.id)
+        .returning(CartItem)
+        .options(selectinload(CartItem.product), selectinload(CartItem.variant))
+    ).all()
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
 
@@ -2144,29 +2118,18 @@ def create_order(
     db.add(order)
     db.flush()  # assign PK to order.id before adding items
 
-    total = 0.0
+    # Validate and reserve stock; product statuses are refreshed after commit
+    restocked_products = {}
     for ci in cart_items:
-        # fetch product to get current price (and validate existence)
-        product = db.query(ProductModel).filter(ProductModel.id == ci.product_id).first()
+        # validate product existence and stock
+        product = ci.product
         if not product:
             # optional: skip or abort; here we abort to keep consistency
             raise HTTPException(status_code=404, detail=f"Product id {ci.product_id} not found")
 
-        # Get variant if exists
-        variant = None
-        variant_price = product.price
-        variant_size = None
-        variant_color = None
-        variant_image_url = None
-        
         if ci.variant_id:
-            variant = db.query(ProductVariant).filter(ProductVariant.id == ci.variant_id).first()
+            variant = ci.variant
             if variant:
-                variant_price = variant.price if variant.price else product.price
-                variant_size = variant.size
-                variant_color = variant.color
-                variant_image_url = variant.image_url
-                
                 # Check variant stock availability
                 if variant.stock < ci.quantity:
                     raise HTTPException(
@@ -2175,8 +2138,7 @@ def create_order(
                     )
                 # Decrease variant stock
                 variant.stock -= ci.quantity
-                # Update product status
-                update_product_status(product, db)
+                restocked_products[product.id] = product
         else:
             # Check product stock (for products without variants)
             if product.stock < ci.quantity:
@@ -2186,42 +2148,62 @@ def create_order(
                 )
             # Decrease product stock
             product.stock -= ci.quantity
-            # Update product status
-            update_product_status(product, db)
-
-        item_price = float(variant_price) * int(ci.quantity)
-        total += item_price
-
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=product.id,
-            variant_id=ci.variant_id,
-            quantity=ci.quantity,
-            price=variant_price,  # price per item (use variant price if available)
-            variant_size=variant_size,  # Snapshot variant info
-            variant_color=variant_color,
-            variant_image_url=variant_image_url,
-            seller_id=product.seller_id,  # Copy seller_id from product
-            status="Pending"  # Initial status
-        )
-        db.add(order_item)
+            restocked_products[product.id] = product
+
+    # Insert the order items in one executemany INSERT ... RETURNING
+    # (render_nulls keeps lines without a variant in the same batch).
+    # Price is the variant price when set, otherwise the product price, and
+    # variant details are snapshotted for display after the variant changes.
+    order_items = db.scalars(
+        insert(OrderItem).returning(OrderItem).execution_options(render_nulls=True),
+        [
+            {
+                "order_id": order.id,
+                "product_id": ci.product_id,
+                "variant_id": ci.variant_id,
+                "quantity": ci.quantity,
+                "price": (ci.variant.price if ci.variant else None) or ci.product.price,
+                "variant_size": ci.variant.size if ci.variant else None,
+                "variant_color": ci.variant.color if ci.variant else None,
+                "variant_image_url": ci.variant.image_url if ci.variant else None,
+                "seller_id": ci.product.seller_id,
+            }
+            for ci in cart_items
+        ],
+    ).all()
 
-    # update total, commit transaction, clear cart
-    order.total_price = total
-    # delete cart items
-    db.query(CartItem).filter(CartItem.user_id == user.id).delete()
+    # update total in one UPDATE ... RETURNING and keep the returned value on
+    # the order, so reading order.total_price doesn't SELECT it back; commit
+    order_total = (
+        select(func.coalesce(func.sum(OrderItem.price * OrderItem.quantity), 0.0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+    total_price = db.execute(
+        update(Order)
+        .where(Order.id == order.id)
+        .values(total_price=order_total)
+        .returning(Order.total_price)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    set_committed_value(order, "total_price", total_price)
     db.commit()
-    db.refresh(order)
+    _invalidate_stats("admin", *{f"seller:{ci.product.seller_id}" for ci in cart_items})
+
+    for product in restocked_products.values():
+        update_product_status(product, db)
     
-    # Load order items with product details and normalize products
-    order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+    # Attach product details to the inserted order items
+    # Products and variants were loaded with the cart; reuse them rather than
+    # querying each again, and normalize each product once
+    products = {ci.product_id: ci.product for ci in cart_items}
+    variants = {ci.variant_id: ci.variant for ci in cart_items if ci.variant_id}
+    for product in products.values():
+        normalize_product_gender(product, db)
     for item in order_items:
-        item.product = db.query(ProductModel).filter(ProductModel.id == item.product_id).first()
-        if item.product:
-            normalize_product_gender(item.product, db)
-        # Load variant if exists
+        item.product = products.get(item.product_id)
         if item.variant_id:
-            item.variant = db.query(ProductVariant).filter(ProductVariant.id == item.variant_id).first()
+            item.variant = variants.get(item.variant_id)
     order.order_items = order_items
     
     # Send order notifications to sellers for each order item
@@ -2265,55 +2247,60 @@ def create_order(
     return order
 
 
+def load_order_details(orders, db: Session):
+    """Attach normalized products and seller info to already-loaded order items"""
+    items = [item for order in orders for item in order.order_items]
+    seller_ids = {item.seller_id for item in items if item.seller_id}
+    sellers = {}
+    if seller_ids:
+        sellers = {u.id: u for u in db.query(User).filter(User.id.in_(seller_ids)).all()}
+    normalized = set()
+    for item in items:
+        if item.product and item.product.id not in normalized:
+            normalize_product_gender(item.product, db)
+            normalized.add(item.product.id)
+        # Add seller info to product if seller_id exists
+        seller = sellers.get(item.seller_id)
+        if seller and item.product:
+            # Add seller info as attributes (will be serialized in response)
+            item.product.seller_username = seller.username
+            item.product.seller_email = seller.email
+    return orders
+
+# Batch-load items, their products and variants instead of one query per row
+_ORDER_DETAIL_OPTIONS = (
+    selectinload(Order.order_items).selectinload(OrderItem.product),
+    selectinload(Order.order_items).selectinload(OrderItem.variant),
+)
+
 # ---------------- List User Orders ----------------
 @app.get("/orders", response_model=list[OrderResponse], tags=["Orders"])
 def list_orders(db: Session = Depends(get_db), current_user_obj: User = Depends(require_customer)):
-    orders = db.query(Order).filter(Order.user_id == current_user_obj.id).order_by(Order.created_at.desc()).all()
+    orders = (
+        db.query(Order)
+        .options(*_ORDER_DETAIL_OPTIONS)
+        .filter(Order.user_id == current_user_obj.id)
+        .order_by(Order.created_at.desc())
+        .all()
+    )
     # Load order items with product details and seller info
-    for order in orders:
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        for item in order_items:
-            item.product = db.query(ProductModel).filter(ProductModel.id == item.product_id).first()
-            if item.product:
-                normalize_product_gender(item.product, db)
-            # Load variant if exists
-            if item.variant_id:
-                item.variant = db.query(ProductVariant).filter(ProductVariant.id == item.variant_id).first()
-            # Add seller info to product if seller_id exists
-            if item.seller_id:
-                seller = db.query(User).filter(User.id == item.seller_id).first()
-                if seller and item.product:
-                    # Add seller info as attributes (will be serialized in response)
-                    item.product.seller_username = seller.username
-                    item.product.seller_email = seller.email
-        order.order_items = order_items
-    return orders
+    return load_order_details(orders, db)
 
 
 # ---------------- Get Order Details ----------------
 @app.get("/orders/{order_id}", response_model=OrderResponse, tags=["Orders"])
 def get_order(order_id: int, db: Session = Depends(get_db), current_user_obj: User = Depends(require_customer)):
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == current_user_obj.id).first()
+    order = (
+        db.query(Order)
+        .options(*_ORDER_DETAIL_OPTIONS)
+        .filter(Order.id == order_id, Order.user_id == current_user_obj.id)
+        .first()
+    )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found or access denied")
 
     # Load order items with product details and seller info
-    order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-    for item in order_items:
-        item.product = db.query(ProductModel).filter(ProductModel.id == item.product_id).first()
-        if item.product:
-            normalize_product_gender(item.product, db)
-        # Load variant if exists
-        if item.variant_id:
-            item.variant = db.query(ProductVariant).filter(ProductVariant.id == item.variant_id).first()
-        # Add seller info to product if seller_id exists
-        if item.seller_id:
-            seller = db.query(User).filter(User.id == item.seller_id).first()
-            if seller and item.product:
-                # Add seller info as attributes (will be serialized in response)
-                item.product.seller_username = seller.username
-                item.product.seller_email = seller.email
-    order.order_items = order_items
+    load_order_details([order], db)
 
     return order
 
@@ -2488,6 +2475,7 @@ def create_multiple_products(
         raise HTTPException(status_code=400, detail="Maximum 100 products allowed per request")
 
     created_products = []
+    rows = []
     errors = []
     
     try:
@@ -2501,7 +2489,7 @@ def create_multiple_products(
                     errors.append(f"Product {idx + 1}: Valid price is required")
                     continue
 
-                product = ProductModel(
+                rows.append(dict(
                     name=item.name.strip(),
                     description=item.description.strip() if item.description else None,
                     image_url=item.image_url.strip() if item.image_url else None,
@@ -2513,17 +2501,14 @@ def create_multiple_products(
                     is_verified=False,
                     verification_status="Pending",
                     submitted_at=datetime.utcnow()
-                )
-                db.add(product)
-                created_products.append(product)
+                ))
             except Exception as e:
                 errors.append(f"Product {idx + 1}: {str(e)}")
                 logger.exception(f"Error creating product {idx + 1}")
 
-        if created_products:
+        if rows:
+            created_products = insert_products(db, rows)
             db.commit()
-            for product in created_products:
-                db.refresh(product)
         else:
             db.rollback()
             raise HTTPException(status_code=400, detail="No products were created. Errors: " + "; ".join(errors))
@@ -2543,6 +2528,57 @@ def create_multiple_products(
 
 
 # ---------------- Wishlist Endpoints ----------------
+def _stream_json_array(batches, schema):
+    """Serialize batches of rows through schema as one JSON array, a batch per chunk"""
+    yield "["
+    for i, batch in enumerate(batches):
+        chunk = ",".join(schema.model_validate(row).model_dump_json() for row in batch)
+        yield chunk if i == 0 else "," + chunk
+    yield "]"
+
+# The read endpoints are hot; lambda statements are built and cached once, so
+# each request only binds the username/product id
+def _wishlist_items_stmt(username: str):
+    return lambda_stmt(lambda: (
+        select(WishlistItem.id, WishlistItem.product_id, WishlistItem.created_at)
+        .join(User, WishlistItem.user_id == User.id)
+        .where(User.username == username, CUSTOMER_ACCESS)
+    ))
+
+# Product cards check wishlist membership one product at a time, so cache
+# (username, product_id) -> bool briefly. add/remove invalidate their own key;
+# other workers may serve a stale answer for at most the TTL.
+WISHLIST_CHECK_TTL_SECONDS = 30
+_WISHLIST_CHECK_MAX_KEYS = 100000
+_wishlist_check_cache: dict[tuple[str, int], tuple[float, bool]] = {}
+_wishlist_check_lock = threading.Lock()
+
+def _cached_wishlist_check(username: str, product_id: int):
+    entry = _wishlist_check_cache.get((username, product_id))
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _cache_wishlist_check(username: str, product_id: int, in_wishlist: bool):
+    now = time.monotonic()
+    with _wishlist_check_lock:
+        if len(_wishlist_check_cache) >= _WISHLIST_CHECK_MAX_KEYS:
+            for key in [k for k, (expires, _) in _wishlist_check_cache.items() if expires <= now]:
+                del _wishlist_check_cache[key]
+            if len(_wishlist_check_cache) >= _WISHLIST_CHECK_MAX_KEYS:
+                _wishlist_check_cache.clear()
+        _wishlist_check_cache[(username, product_id)] = (now + WISHLIST_CHECK_TTL_SECONDS, in_wishlist)
+
+def _invalidate_wishlist_check(username: str, product_id: int):
+    _wishlist_check_cache.pop((username, product_id), None)
+
+def _wishlist_contains_stmt(username: str, product_id: int):
+    return lambda_stmt(lambda: select(
+        exists()
+        .where(WishlistItem.user_id == User.id)
+        .where(User.username == username, CUSTOMER_ACCESS, WishlistItem.product_id == product_id)
+    ))
+
 @app.post("/wishlist/add/{product_id}", response_model=WishlistItemResponse, tags=["Wishlist"])
 def add_to_wishlist(
     product_id: int,
@@ -2550,22 +2586,24 @@ def add_to_wishlist(
     current_user_obj: User = Depends(require_customer)
 ):
     # Check if product exists
-    product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
-    if not product:
+    product_exists = db.query(
+        db.query(ProductModel.id).filter(ProductModel.id == product_id).exists()
+    ).scalar()
+    if not product_exists:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Check if already in wishlist
-    existing = db.query(WishlistItem).filter(
-        WishlistItem.user_id == current_user_obj.id,
-        WishlistItem.product_id == product_id
+    # Insert unless already present, in one statement; the unique
+    # ix_wishlist_user_product index makes concurrent adds safe
+    wishlist_item = db.scalars(
+        sqlite_insert(WishlistItem)
+        .values(user_id=current_user_obj.id, product_id=product_id, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["user_id", "product_id"])
+        .returning(WishlistItem)
     ).first()
-    if existing:
+    if wishlist_item is None:
         raise HTTPException(status_code=400, detail="Product already in wishlist")
-
-    wishlist_item = WishlistItem(user_id=current_user_obj.id, product_id=product_id)
-    db.add(wishlist_item)
     db.commit()
-    db.refresh(wishlist_item)
+    _invalidate_wishlist_check(current_user_obj.username, product_id)
     return wishlist_item
 
 @app.delete("/wishlist/remove/{product_id}", tags=["Wishlist"])
@@ -2584,75 +2622,100 @@ def remove_from_wishlist(
 
     db.delete(wishlist_item)
     db.commit()
+    _invalidate_wishlist_check(current_user_obj.username, product_id)
     return {"message": "Item removed from wishlist"}
 
 @app.get("/wishlist", response_model=list[WishlistItemResponse], tags=["Wishlist"])
 def get_wishlist(
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user: str = Depends(get_current_user)
 ):
-    return db.query(WishlistItem).filter(WishlistItem.user_id == current_user_obj.id).all()
+    # Resolve the user and their wishlist in one joined query, fetching only
+    # the columns in the response, and stream it in batches of 100 rows
+    result = db.execute(_wishlist_items_stmt(current_user), execution_options={"yield_per": 100})
+    batches = result.partitions()
+    first = next(batches, None)
+    if first is None:
+        result.close()
+        check_customer_access(current_user, db)
+        return []
+    return StreamingResponse(
+        _stream_json_array(itertools.chain([first], batches), WishlistItemResponse),
+        media_type="application/json"
+    )
 
-@app.get("/wishlist/check/{product_id}", response_model=dict, tags=["Wishlist"])
+@app.get("/wishlist/check/{product_id}", response_model=WishlistStatusResponse, tags=["Wishlist"])
 def check_wishlist_status(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user_obj: User = Depends(require_customer)
+    current_user: str = Depends(get_current_user)
 ):
-    exists = db.query(WishlistItem).filter(
-        WishlistItem.user_id == current_user_obj.id,
-        WishlistItem.product_id == product_id
-    ).first() is not None
+    in_wishlist = _cached_wishlist_check(current_user, product_id)
+    if in_wishlist is not None:
+        return {"in_wishlist": in_wishlist}
 
-    return {"in_wishlist": exists}
+    in_wishlist = db.execute(_wishlist_contains_stmt(current_user, product_id)).scalar()
+    if not in_wishlist:
+        check_customer_access(current_user, db)
+    _cache_wishlist_check(current_user, product_id, in_wishlist)
 
-# Test endpoint to check OTP (for debugging)
-@app.get("/test/user-otp/{email}", tags=["Auth"])
-def get_user_otp(email: str, db: Session = Depends(get_db)):
-    """Get OTP for a user (for testing purposes only)"""
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return {
-        "email": user.email,
-        "is_active": user.is_active,
-        "otp": user.otp,
-        "otp_expiry": user.otp_expiry.isoformat() if user.otp_expiry else None,
-        "otp_valid": user.otp_expiry > datetime.utcnow() if user.otp_expiry else False
-    }
+    return {"in_wishlist": in_wishlist}
+
+@app.post("/wishlist/check", response_model=dict[int, bool], tags=["Wishlist"])
+def bulk_check_wishlist_status(
+    data: WishlistBulkCheckRequest,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Check wishlist membership for a page of products in one request"""
+    if len(data.product_ids) > 100:
+        raise HTTPException(status_code=400, detail="Maximum 100 products per check")
+    if not data.product_ids:
+        return {}
+
+    present = set(db.scalars(
+        select(WishlistItem.product_id)
+        .join(User, WishlistItem.user_id == User.id)
+        .where(
+            User.username == current_user,
+            CUSTOMER_ACCESS,
+            WishlistItem.product_id.in_(data.product_ids)
+        )
+    ))
+    if not present:
+        check_customer_access(current_user, db)
+
+    return {product_id: product_id in present for product_id in data.product_ids}
 
 # OTP Verification Endpoints
 @app.post("/verify-otp", tags=["Auth"])
 def verify_otp(data: VerifyOTPRequest, db: Session = Depends(get_db)):
     """Verify OTP and activate user account"""
+    if not allow_attempt(f"verify-otp:{data.email}", VERIFY_ATTEMPT_LIMIT, VERIFY_WINDOW_SECONDS):
+        raise HTTPException(status_code=429, detail="Too many verification attempts. Please try again in a minute.")
+
+    # Check the OTP and activate the account in one statement, so two concurrent
+    # verifies can't both succeed. Customers are auto-approved; sellers still
+    # need admin approval.
+    if consume_otp(db, data.email, data.otp) is not None:
+        db.commit()
+        logger.info("Email verified and account activated for user: %s", data.email)
+        return {"message": "Email verified successfully! Your account is now active."}
+
+    # Not verified: look the user up only to pick the right error
     user = db.query(User).filter(User.email == data.email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not user.otp:
+    otp_status = check_otp(user, data.otp)
+    if otp_status == OTP_MISSING:
         raise HTTPException(status_code=400, detail="No OTP found. Please request a new OTP.")
-
-    if user.otp != data.otp:
-        raise HTTPException(status_code=400, detail="Invalid OTP")
-
-    if user.otp_expiry < datetime.utcnow():
+    if otp_status == OTP_EXPIRED:
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new OTP.")
-
-    # Activate user account
-    user.is_active = True
-    user.otp = None
-    user.otp_expiry = None
-    
-    # For customers: auto-approve (bypass approval requirement)
-    # For sellers: approval still required from admin
-    if user.role == "customer":
-        user.is_approved = True
-    
-    db.commit()
-
-    logger.info("Email verified and account activated for user: %s", user.email)
-    return {"message": "Email verified successfully! Your account is now active."}
+    if record_failed_otp(user):
+        db.commit()
+        raise HTTPException(status_code=400, detail="Too many invalid attempts. Please request a new OTP.")
+    raise HTTPException(status_code=400, detail="Invalid OTP")
 
 # ==================== SELLER ROUTES ====================
 
@@ -2700,13 +2763,15 @@ async def upload_images(
 
 @app.get("/seller/products", response_model=list[ProductSchema], tags=["Seller"])
 def get_seller_products(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_seller: User = Depends(require_approved_seller)
 ):
-    """Get all products for the current seller"""
+    """Get the current seller's products, newest first, a page at a time"""
     products = db.query(ProductModel).filter(
         ProductModel.seller_id == current_seller.id
-    ).order_by(ProductModel.id.desc()).all()
+    ).order_by(ProductModel.id.desc()).offset(skip).limit(limit).all()
     return [normalize_product_gender(p, db) for p in products]
 
 @app.post("/seller/products/create", response_model=ProductSchema, tags=["Seller"])
@@ -2912,6 +2977,7 @@ def create_seller_products_bulk(
         raise HTTPException(status_code=400, detail="Maximum 100 products allowed per request")
 
     created_products = []
+    rows = []
     errors = []
     
     try:
@@ -2931,7 +2997,7 @@ def create_seller_products_bulk(
                     if gender_lower in ['men', 'women', 'unisex']:
                         normalized_gender = gender_lower
                 
-                product = ProductModel(
+                rows.append(dict(
                     name=item.name.strip(),
                     description=item.description.strip() if item.description else None,
                     image_url=item.image_url.strip() if item.image_url else None,
@@ -2941,18 +3007,16 @@ def create_seller_products_bulk(
                     category=item.category.strip() if item.category else None,
                     seller_id=current_seller.id,
                     is_verified=False  # Requires admin verification
-                )
-                db.add(product)
-                created_products.append(product)
+                ))
             except Exception as e:
                 errors.append(f"Product {idx + 1}: {str(e)}")
                 logger.exception(f"Error creating product {idx + 1}")
 
-        if created_products:
+        if rows:
+            created_products = insert_products(db, rows)
             db.commit()
             for product in created_products:
-                db.refresh(product)
-                normalize_product_gender(product, db)
+                normalize_product_gender(product)
         else:
             db.rollback()
             raise HTTPException(status_code=400, detail="No products were created. Errors: " + "; ".join(errors))
@@ -3447,69 +3511,77 @@ def get_product_stock(
         variants=variant_info
     )
 
+# Dashboard stats are several aggregates over whole tables and are polled by
+# the dashboards, so results are cached for a short TTL: in Redis when it is
+# configured (shared by all workers), otherwise per process. Orders and
+# product verification drop the affected keys; anything else shows up within
+# the TTL.
+STATS_CACHE_TTL_SECONDS = 30
+_stats_cache: dict[str, tuple[float, dict]] = {}
+
+def _cached_stats(key: str, compute):
+    """Return the cached stats dict for key, computing and storing it on a miss"""
+    if redis_client is not None:
+        cached = redis_client.get(f"stats:{key}")
+        if cached is not None:
+            return json.loads(cached)
+        result = compute()
+        redis_client.set(f"stats:{key}", json.dumps(result), ex=STATS_CACHE_TTL_SECONDS)
+        return result
+
+    entry = _stats_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    result = compute()
+    _stats_cache[key] = (time.monotonic() + STATS_CACHE_TTL_SECONDS, result)
+    return result
+
+def _invalidate_stats(*keys: str):
+    if redis_client is not None:
+        redis_client.delete(*(f"stats:{key}" for key in keys))
+    for key in keys:
+        _stats_cache.pop(key, None)
+
 @app.get("/seller/stats", tags=["Seller"])
 def get_seller_stats(
     db: Session = Depends(get_db),
     current_seller: User = Depends(require_approved_seller)
 ):
     """Get seller dashboard statistics (seller only)"""
-    # Total products
-    total_products = db.query(ProductModel).filter(
-        ProductModel.seller_id == current_seller.id
-    ).count()
-    
-    # Verified products
-    verified_products = db.query(ProductModel).filter(
-        ProductModel.seller_id == current_seller.id,
-        ProductModel.is_verified == True
-    ).count()
-    
-    # Pending products
-    pending_products = db.query(ProductModel).filter(
-        ProductModel.seller_id == current_seller.id,
-        ProductModel.is_verified == False
-    ).count()
-    
-    # Get all orders that contain products from this seller
-    # First, get all product IDs for this seller
-    seller_product_ids = [p.id for p in db.query(ProductModel).filter(
-        ProductModel.seller_id == current_seller.id
-    ).all()]
-    
-    if seller_product_ids:
-        # Get orders that have items with seller's products
-        orders_with_seller_products = db.query(Order).join(OrderItem).filter(
-            OrderItem.product_id.in_(seller_product_ids)
-        ).distinct().all()
-        
-        total_orders = len(orders_with_seller_products)
-        
-        # Calculate total revenue from seller's products
-        total_revenue = 0.0
-        for order in orders_with_seller_products:
-            # Calculate seller's portion of each order
-            order_items = db.query(OrderItem).filter(
-                OrderItem.order_id == order.id,
-                OrderItem.product_id.in_(seller_product_ids)
-            ).all()
-            for item in order_items:
-                total_revenue += float(item.price) * int(item.quantity)
-        
-        # Pending orders (orders with status "Pending")
-        pending_orders = len([o for o in orders_with_seller_products if o.status == "Pending"])
-    else:
-        total_orders = 0
-        total_revenue = 0.0
-        pending_orders = 0
-    
-    return {
-        "total_products": total_products,
-        "verified_products": verified_products,
-        "pending_products": pending_products,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "total_revenue": float(total_revenue)
-    }
+    def compute():
+        # Product counts in one pass over the seller's products
+        total_products, verified_products, pending_products = db.execute(
+            select(
+                func.count(ProductModel.id),
+                func.coalesce(func.sum(case((ProductModel.is_verified == True, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((ProductModel.is_verified == False, 1), else_=0)), 0),
+            ).where(ProductModel.seller_id == current_seller.id)
+        ).one()
+
+        # Orders containing the seller's products and the seller's share of their
+        # revenue, aggregated over the joined order items in one query
+        total_orders, pending_orders, total_revenue = db.execute(
+            select(
+                func.count(Order.id.distinct()),
+                func.count(case((Order.status == "Pending", Order.id)).distinct()),
+                func.coalesce(func.sum(OrderItem.price * OrderItem.quantity), 0.0),
+            )
+            .select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(ProductModel, ProductModel.id == OrderItem.product_id)
+            .where(ProductModel.seller_id == current_seller.id)
+        ).one()
+
+        return {
+            "total_products": total_products,
+            "verified_products": verified_products,
+            "pending_products": pending_products,
+            "total_orders": total_orders,
+            "pending_orders": pending_orders,
+            "total_revenue": float(total_revenue)
+        }
+
+    return _cached_stats(f"seller:{current_seller.id}", compute)
 
 @app.get("/seller/orders", response_model=SellerOrderItemListResponse, tags=["Seller Orders"])
 def get_seller_orders(
@@ -4119,20 +4191,24 @@ def mark_return_received(
 
 @app.get("/admin/sellers", response_model=list[SellerResponse], tags=["Admin"])
 def list_sellers(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_admin: User = Depends(require_admin)
 ):
-    """List all sellers (admin only)"""
-    sellers = db.query(User).filter(User.role == "seller").all()
+    """List sellers a page at a time (admin only)"""
+    sellers = db.query(User).filter(User.role == "seller").order_by(User.id).offset(skip).limit(limit).all()
     return sellers
 
 @app.get("/admin/users", response_model=list[UserResponse], tags=["Admin"])
 def list_all_users(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_admin: User = Depends(require_admin)
 ):
-    """List all users (admin only) - returns customers and sellers"""
-    users = db.query(User).order_by(User.id.desc()).all()
+    """List users, newest first, a page at a time (admin only) - returns customers and sellers"""
+    users = db.query(User).order_by(User.id.desc()).offset(skip).limit(limit).all()
     return users
 
 @app.get("/admin/users/{user_id}", response_model=UserDetailResponse, tags=["Admin"])
@@ -4331,10 +4407,10 @@ def delete_user(
     db.query(Address).filter(Address.user_id == user_id).delete()
     
     # Delete order items (via cascade from orders)
-    # Get all order IDs first
-    order_ids = [o.id for o in db.query(Order).filter(Order.user_id == user_id).all()]
-    if order_ids:
-        db.query(OrderItem).filter(OrderItem.order_id.in_(order_ids)).delete()
+    # The user's orders are matched in a subquery, not loaded first
+    db.query(OrderItem).filter(
+        OrderItem.order_id.in_(select(Order.id).where(Order.user_id == user_id))
+    ).delete()
     
     # Delete orders
     db.query(Order).filter(Order.user_id == user_id).delete()
@@ -4342,10 +4418,9 @@ def delete_user(
     # If seller, delete their products
     if user.role == "seller":
         # Delete cart items referencing seller's products
-        seller_product_ids = [p.id for p in db.query(ProductModel).filter(ProductModel.seller_id == user_id).all()]
-        if seller_product_ids:
-            db.query(CartItem).filter(CartItem.product_id.in_(seller_product_ids)).delete()
-            db.query(OrderItem).filter(OrderItem.product_id.in_(seller_product_ids)).delete()
+        seller_product_ids = select(ProductModel.id).where(ProductModel.seller_id == user_id)
+        db.query(CartItem).filter(CartItem.product_id.in_(seller_product_ids)).delete()
+        db.query(OrderItem).filter(OrderItem.product_id.in_(seller_product_ids)).delete()
         # Delete products
         db.query(ProductModel).filter(ProductModel.seller_id == user_id).delete()
     
@@ -4358,11 +4433,13 @@ def delete_user(
 
 @app.get("/admin/orders", response_model=list[OrderResponse], tags=["Admin"])
 def list_all_orders(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_admin: User = Depends(require_admin)
 ):
-    """List all orders (admin only)"""
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
+    """List orders, newest first, a page at a time (admin only)"""
+    orders = db.query(Order).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
     # Load order items with product details
     for order in orders:
         order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
@@ -4423,31 +4500,45 @@ def get_admin_stats(
     current_admin: User = Depends(require_admin)
 ):
     """Get admin dashboard statistics (admin only)"""
-    total_users = db.query(User).count()
-    total_customers = db.query(User).filter(User.role == "customer").count()
-    total_sellers = db.query(User).filter(User.role == "seller").count()
-    total_products = db.query(ProductModel).count()
-    pending_products = db.query(ProductModel).filter(ProductModel.is_verified == False).count()
-    total_orders = db.query(Order).count()
-    
-    # Calculate total revenue
-    total_revenue = db.query(Order).with_entities(
-        db.func.sum(Order.total_price)
-    ).scalar() or 0.0
-    
-    # Pending orders
-    pending_orders = db.query(Order).filter(Order.status == "Pending").count()
-    
-    return {
-        "total_users": total_users,
-        "total_customers": total_customers,
-        "total_sellers": total_sellers,
-        "total_products": total_products,
-        "pending_products": pending_products,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "total_revenue": float(total_revenue)
-    }
+    def compute():
+        # One conditional aggregate per table, fetched together in one round-trip
+        users = select(
+            func.count(User.id).label("total"),
+            func.coalesce(func.sum(case((User.role == "customer", 1), else_=0)), 0).label("customers"),
+            func.coalesce(func.sum(case((User.role == "seller", 1), else_=0)), 0).label("sellers"),
+        ).subquery()
+        products = select(
+            func.count(ProductModel.id).label("total"),
+            func.coalesce(func.sum(case((ProductModel.is_verified == False, 1), else_=0)), 0).label("pending"),
+        ).subquery()
+        orders = select(
+            func.count(Order.id).label("total"),
+            func.coalesce(func.sum(case((Order.status == "Pending", 1), else_=0)), 0).label("pending"),
+            func.coalesce(func.sum(Order.total_price), 0.0).label("revenue"),
+        ).subquery()
+        stats = db.execute(
+            select(
+                users.c.total, users.c.customers, users.c.sellers,
+                products.c.total, products.c.pending,
+                orders.c.total, orders.c.pending, orders.c.revenue,
+            ).select_from(users.join(products, true()).join(orders, true()))
+        ).one()
+        (total_users, total_customers, total_sellers,
+         total_products, pending_products,
+         total_orders, pending_orders, total_revenue) = stats
+
+        return {
+            "total_users": total_users,
+            "total_customers": total_customers,
+            "total_sellers": total_sellers,
+            "total_products": total_products,
+            "pending_products": pending_products,
+            "total_orders": total_orders,
+            "pending_orders": pending_orders,
+            "total_revenue": float(total_revenue)
+        }
+
+    return _cached_stats("admin", compute)
 
 # ==================== ADMIN RETURN ROUTES ====================
 
@@ -4983,6 +5074,34 @@ def approve_seller(
     db.commit()
     return {"message": f"Seller {seller.username} approved successfully"}
 
+@app.post("/admin/sellers/approve_bulk", tags=["Admin"])
+def approve_sellers_bulk(
+    payload: BulkIdsRequest,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(require_admin)
+):
+    """
+    Approve several seller accounts in one transaction (admin only).
+    Ids that are not sellers, or whose email is not verified yet, are skipped.
+    """
+    if len(payload.ids) > 100:
+        raise HTTPException(status_code=400, detail="Maximum 100 sellers per request")
+    if not payload.ids:
+        return {"approved": [], "skipped": []}
+
+    approved_ids = set(db.scalars(
+        update(User)
+        .where(User.id.in_(payload.ids), User.role == "seller", User.is_active == True)
+        .values(is_approved=True)
+        .returning(User.id)
+    ))
+    db.commit()
+
+    return {
+        "approved": sorted(approved_ids),
+        "skipped": [user_id for user_id in payload.ids if user_id not in approved_ids],
+    }
+
 @app.post("/admin/sellers/reject/{user_id}", tags=["Admin"])
 def reject_seller(
     user_id: int,
@@ -5146,6 +5265,7 @@ def approve_product(
     product.is_verified = True
     product.verification_notes = None  # Clear any rejection notes
     db.commit()
+    _invalidate_stats("admin", f"seller:{product.seller_id}")
     db.refresh(product)
     normalize_product_gender(product)
     
@@ -5180,6 +5300,7 @@ def reject_product(
     product.is_verified = False
     product.verification_notes = request.notes
     db.commit()
+    _invalidate_stats("admin", f"seller:{product.seller_id}")
     db.refresh(product)
     normalize_product_gender(product)
     
@@ -5216,10 +5337,56 @@ def verify_product_legacy(
     product.is_verified = True
     product.verification_notes = None
     db.commit()
+    _invalidate_stats("admin", f"seller:{product.seller_id}")
     db.refresh(product)
     normalize_product_gender(product)
     return product
 
+@app.post("/admin/products/verify_bulk", tags=["Admin"])
+def verify_products_bulk(
+    payload: BulkIdsRequest,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(require_admin)
+):
+    """Approve several products in one transaction (admin only)"""
+    if len(payload.ids) > 100:
+        raise HTTPException(status_code=400, detail="Maximum 100 products per request")
+    if not payload.ids:
+        return {"approved": [], "not_found": []}
+
+    approved = db.execute(
+        update(ProductModel)
+        .where(ProductModel.id.in_(payload.ids))
+        .values(verification_status="Approved", is_verified=True, verification_notes=None)
+        .returning(ProductModel.id, ProductModel.name, ProductModel.seller_id)
+    ).all()
+
+    # Seller notifications go in the same transaction, with one commit for all
+    notification_rows = [
+        {
+            "type": "approval",
+            "message": f"Product Approved: {row.name} has been approved and is now live",
+            "seller_id": row.seller_id,
+            "product_id": row.id,
+            "priority": "medium",
+        }
+        for row in approved if row.seller_id
+    ]
+    notifications = []
+    if notification_rows:
+        notifications = db.scalars(insert(Notification).returning(Notification), notification_rows).all()
+    db.commit()
+    _invalidate_stats("admin", *{f"seller:{row.seller_id}" for row in approved})
+
+    for notification in notifications:
+        broadcast_notification_sync(notification)
+
+    approved_ids = {row.id for row in approved}
+    return {
+        "approved": sorted(approved_ids),
+        "not_found": [product_id for product_id in payload.ids if product_id not in approved_ids],
+    }
+
 # ==================== ADMIN PRODUCT MANAGEMENT ====================
 
 @app.get("/admin/products", response_model=list[AdminProductResponse], tags=["Admin"])
@@ -5655,7 +5822,7 @@ def get_out_of_stock_products(
     if category:
         base_query = base_query.filter(ProductModel.category == category)
     if gender:
-        base_query = base_query.filter(func.lower(ProductModel.gender) == gender.lower())
+        base_query = base_query.filter(ProductModel.gender == gender.lower())
     
     products = base_query.all()
     
@@ -5722,7 +5889,7 @@ def get_admin_low_stock_products(
     if category:
         base_query = base_query.filter(ProductModel.category == category)
     if gender:
-        base_query = base_query.filter(func.lower(ProductModel.gender) == gender.lower())
+        base_query = base_query.filter(ProductModel.gender == gender.lower())
     
     products = base_query.all()
     
@@ -5791,7 +5958,7 @@ def get_admin_inventory(
     if category:
         base_query = base_query.filter(ProductModel.category == category)
     if gender:
-        base_query = base_query.filter(func.lower(ProductModel.gender) == gender.lower())
+        base_query = base_query.filter(ProductModel.gender == gender.lower())
     
     total = base_query.count()
     offset = (page - 1) * page_size
@@ -5902,6 +6069,7 @@ def admin_update_product_stock(
 
 @app.post("/admin/create-super-admin", tags=["Admin"])
 def create_super_admin(
+    background_tasks: BackgroundTasks,
     username: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
@@ -5912,50 +6080,33 @@ def create_super_admin(
     This endpoint is only accessible if no super admin exists yet.
     After first super admin is created, this endpoint should be disabled.
     """
-    # Check if any super admin already exists
-    existing_admin = db.query(User).filter(
-        (User.role == "admin") | (User.is_admin == True)
-    ).first()
-    
-    if existing_admin:
+    # Existing admins and username/email conflicts, in one query
+    matches = db.query(User.username, User.email, User.role, User.is_admin).filter(
+        or_(User.role == "admin", User.is_admin == True, User.username == username, User.email == email)
+    ).all()
+
+    if any(row.role == "admin" or row.is_admin for row in matches):
         raise HTTPException(
             status_code=403,
             detail="Super admin already exists. Use regular admin endpoints."
         )
+
+    for field, value in (("username", username), ("email", email)):
+        if any(getattr(row, field) == value for row in matches):
+            raise HTTPException(status_code=400, detail=f"{field.capitalize()} already exists")
     
-    # Check if username/email already exists
-    if db.query(User).filter(User.username == username).first():
-        raise HTTPException(status_code=400, detail="Username already exists")
-    if db.query(User).filter(User.email == email).first():
-        raise HTTPException(status_code=400, detail="Email already exists")
-    
-    # Generate OTP for email verification
-    otp = generate_otp()
-    expiry = datetime.utcnow() + timedelta(minutes=10)
     hashed_pw = hash_password(password)
     
     # Create super admin user
-    super_admin = User(
+    create_pending_account(
+        db, background_tasks, "Super admin creation",
         username=username,
         email=email,
         hashed_password=hashed_pw,
-        is_active=False,  # Will be True after OTP verification
-        otp=otp,
-        otp_expiry=expiry,
         role="admin",
         is_admin=True,  # Super admin flag
         is_approved=True  # Auto-approved
     )
-    db.add(super_admin)
-    db.commit()
-    db.refresh(super_admin)
-    
-    # Send OTP email
-    try:
-        send_otp_email(email, otp)
-        logger.info("OTP sent to super admin email: %s", email)
-    except Exception as e:
-        logger.exception("Failed to send OTP email: %s", str(e))
     
     return {
         "message": "Super admin account created successfully. Please verify your email with the OTP sent to your inbox.",
@@ -5963,9 +6114,12 @@ def create_super_admin(
         "email": email
     }
 
-@app.post("/resend-otp", tags=["Auth"])
-def resend_otp(data: ResendOTPRequest, db: Session = Depends(get_db)):
+@app.post("/resend-otp", tags=["Auth"], status_code=202)
+def resend_otp(data: ResendOTPRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Resend OTP to user's email"""
+    if not allow_attempt(f"resend-otp:{data.email}", RESEND_LIMIT, RESEND_WINDOW_SECONDS):
+        raise HTTPException(status_code=429, detail="Too many OTP requests. Please try again in a few minutes.")
+
     user = db.query(User).filter(User.email == data.email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -5975,27 +6129,13 @@ def resend_otp(data: ResendOTPRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email is already verified and account is active")
 
     # Generate new OTP
-    otp = generate_otp()
-    expiry = datetime.utcnow() + timedelta(minutes=10)
-    
-    user.otp = otp
-    user.otp_expiry = expiry
+    otp = issue_otp(user)
     db.commit()
 
-    # Send OTP email
-    try:
-        send_otp_email(user.email, otp)
-        logger.info("OTP resent to email: %s", user.email)
-        return {"message": "OTP has been resent to your email. Please check your inbox."}
-    except ValueError as e:
-        logger.exception("Email configuration error: %s", str(e))
-        raise HTTPException(status_code=500, detail="Email service not configured. Please contact support.")
-    except ConnectionError as e:
-        logger.exception("SMTP connection error: %s", str(e))
-        raise HTTPException(status_code=500, detail="Unable to connect to email server. Please try again later.")
-    except Exception as e:
-        logger.exception("Failed to send OTP email: %s", str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to send OTP email: {str(e)}. Please try again later.")
+    # Send OTP email after the response; the pooled SMTP sender reuses its
+    # connection across bursts of resends
+    background_tasks.add_task(send_otp_email_background, user.email, otp)
+    return {"message": "OTP has been resent to your email. Please check your inbox."}
 
 # ==================== PASSWORD RESET ENDPOINTS ====================
 
@@ -6003,6 +6143,7 @@ def resend_otp(data: ResendOTPRequest, db: Session = Depends(get_db)):
 def forgot_password(
     data: ForgotPasswordRequest,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -6049,9 +6190,9 @@ def forgot_password(
         
         reset_url = f"{origin}{reset_path}?email={email}&token={reset_token}"
         
-        # Send password reset email
-        send_password_reset_email(user.email, reset_token, reset_url)
-        logger.info(f"Password reset email sent to: {email}")
+        # Send password reset email after the response is returned
+        background_tasks.add_task(send_email_background, send_password_reset_email, user.email, reset_token, reset_url)
+        logger.info(f"Password reset email queued for: {email}")
         
         return {"message": generic_message}
         
@@ -6065,8 +6206,19 @@ def forgot_password(
         return {"message": generic_message}
 
 
+def check_reset_otp_rate(email: str) -> None:
+    """Limit OTP password-reset attempts per account, as /verify-otp does"""
+    if not allow_attempt(f"reset-otp:{email}", VERIFY_ATTEMPT_LIMIT, VERIFY_WINDOW_SECONDS):
+        raise HTTPException(status_code=429, detail="Too many reset attempts. Please try again in a minute.")
+
+def record_failed_reset_otp(db: Session, user: User, otp_status: str) -> None:
+    """Count a wrong reset OTP; raise once the OTP has been invalidated for too many failures"""
+    if otp_status == OTP_INVALID and record_failed_otp(user):
+        db.commit()
+        raise HTTPException(status_code=400, detail="Too many invalid attempts. Please request a new password reset.")
+
 @app.post("/auth/reset-password", tags=["Auth"])
-def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(data: ResetPasswordRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Reset password using token from email.
     Validates token, checks expiration, and updates password.
@@ -6090,20 +6242,22 @@ def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
     
     if is_otp:
         # OTP-based reset
+        check_reset_otp_rate(email)
         user = db.query(User).filter(User.email == email).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        if not user.otp or user.otp != otp_or_token:
+        otp_status = check_otp(user, otp_or_token)
+        if otp_status == OTP_EXPIRED:
             raise HTTPException(
                 status_code=400,
-                detail="Invalid OTP. Please request a new password reset."
+                detail="OTP expired. Please request a new password reset."
             )
-        
-        if not user.otp_expiry or user.otp_expiry < datetime.utcnow():
+        if otp_status != OTP_VALID:
+            record_failed_reset_otp(db, user, otp_status)
             raise HTTPException(
                 status_code=400,
-                detail="OTP expired. Please request a new password reset."
+                detail="Invalid OTP. Please request a new password reset."
             )
     else:
         # Token-based reset
@@ -6130,19 +6284,14 @@ def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
         
         # Clear OTP/token fields
         if is_otp:
-            user.otp = None
-            user.otp_expiry = None
+            clear_otp(user)
         else:
             invalidate_reset_token(user, db)
         
         db.commit()
         
-        # Send success email
-        try:
-            send_password_reset_success_email(user.email)
-        except Exception as e:
-            # Log but don't fail the reset if email fails
-            logger.warning(f"Failed to send password reset success email: {e}")
+        # Send success email after the response; a failure is only logged
+        background_tasks.add_task(send_email_background, send_password_reset_success_email, user.email)
         
         logger.info(f"Password reset successful for user: {email}")
         return {"message": "Password has been reset successfully. You can now login with your new password."}
@@ -6160,7 +6309,7 @@ def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
 # ==================== USER PASSWORD RESET ENDPOINTS (OTP-based) ====================
 
 @app.post("/users/forgot-password", tags=["Users"])
-def users_forgot_password(data: ForgotPasswordRequest, db: Session = Depends(get_db)):
+def users_forgot_password(data: ForgotPasswordRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Request password reset using OTP.
     Generates OTP and sends it to user's email.
@@ -6178,25 +6327,13 @@ def users_forgot_password(data: ForgotPasswordRequest, db: Session = Depends(get
         return {"message": generic_message}
     
     try:
-        # Generate OTP for password reset
-        otp = generate_otp()
-        expiry = datetime.utcnow() + timedelta(minutes=10)
-        
-        # Save OTP in user record
-        user.otp = otp
-        user.otp_expiry = expiry
+        # Generate and store OTP for password reset
+        otp = issue_otp(user)
         db.commit()
         
-        # Send OTP email
-        try:
-            send_otp_email(user.email, otp)
-            logger.info(f"Password reset OTP sent to: {email}")
-        except ValueError as e:
-            logger.exception("Email configuration error: %s", str(e))
-            # Still return generic message
-        except Exception as e:
-            logger.exception("Failed to send password reset OTP email: %s", str(e))
-            # Still return generic message for security
+        # Send OTP email after the response. Failures are only logged, and the
+        # response time no longer reveals whether the email exists.
+        background_tasks.add_task(send_otp_email_background, user.email, otp)
         
         return {"message": generic_message}
         
@@ -6208,7 +6345,7 @@ def users_forgot_password(data: ForgotPasswordRequest, db: Session = Depends(get
 
 
 @app.post("/users/reset-password", tags=["Users"])
-def users_reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
+def users_reset_password(data: ResetPasswordRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Reset password using OTP.
     Validates OTP, checks if new password equals old password, and updates password.
@@ -6220,6 +6357,7 @@ def users_reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
         raise HTTPException(status_code=400, detail="Either 'otp_or_token' or 'token' must be provided")
     new_password = data.new_password
     
+    check_reset_otp_rate(email)
     # Find user by email
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -6232,22 +6370,22 @@ def users_reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
             detail="Invalid OTP format. OTP must be 6 digits."
         )
     
-    if not user.otp:
+    otp_status = check_otp(user, otp_or_token)
+    if otp_status == OTP_MISSING:
         raise HTTPException(
             status_code=400,
             detail="No OTP found. Please request a new password reset."
         )
-    
-    if user.otp != otp_or_token:
+    if otp_status == OTP_EXPIRED:
         raise HTTPException(
             status_code=400,
-            detail="Invalid OTP. Please check your email and try again."
+            detail="OTP expired. Please request a new password reset."
         )
-    
-    if not user.otp_expiry or user.otp_expiry < datetime.utcnow():
+    if otp_status != OTP_VALID:
+        record_failed_reset_otp(db, user, otp_status)
         raise HTTPException(
             status_code=400,
-            detail="OTP expired. Please request a new password reset."
+            detail="Invalid OTP. Please check your email and try again."
         )
     
     # Validate password strength
@@ -6271,17 +6409,12 @@ def users_reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
         user.hashed_password = hashed_password
         
         # Clear OTP fields
-        user.otp = None
-        user.otp_expiry = None
+        clear_otp(user)
         
         db.commit()
         
-        # Send success email
-        try:
-            send_password_reset_success_email(user.email)
-        except Exception as e:
-            # Log but don't fail the reset if email fails
-            logger.warning(f"Failed to send password reset success email: {e}")
+        # Send success email after the response; a failure is only logged
+        background_tasks.add_task(send_email_background, send_password_reset_success_email, user.email)
         
         logger.info(f"Password reset successful for user: {email}")
         return {"message": "Password reset successful"}
@@ -6555,7 +6688,7 @@ async def websocket_admin_endpoint(websocket: WebSocket):
             # Check if user is admin
             db = SessionLocal()
             try:
-                user = db.query(User).filter(User.username == username).first()
+                user = db.query(User.is_admin, User.role).filter(User.username == username).first()
                 if not user or (not user.is_admin and user.role != "admin"):
                     await websocket.close(code=1008, reason="Admin access required")
                     return
@@ -6609,7 +6742,7 @@ async def websocket_seller_endpoint(websocket: WebSocket, seller_id: int):
             # Check if user is the seller
             db = SessionLocal()
             try:
-                user = db.query(User).filter(User.username == username).first()
+                user = db.query(User.id, User.role, User.is_seller).filter(User.username == username).first()
                 if not user:
                     await websocket.close(code=1008, reason="User not found")
                     return
@@ -1,10 +1,25 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, JSON, Index, func, literal_column
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, timedelta
 from database import Base
 
+def normalize_product_gender_value(value):
+    # Stored lowercase (men/women/unisex) so listings can filter with plain
+    # equality on the index and responses need no post-processing; missing
+    # or unrecognized values count as unisex
+    if not isinstance(value, str):
+        return "unisex"
+    value = value.strip().lower()
+    return value if value in ("men", "women", "unisex") else "unisex"
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Storefront listings: approved products filtered by gender, newest first
+        Index("ix_products_approved_gender", "verification_status", "gender", "id"),
+        # Seller dashboards and inventory; also serves seller_id-only lookups
+        Index("ix_products_seller_verified", "seller_id", "is_verified"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -12,9 +27,9 @@ class Product(Base):
     image_url = Column(String, nullable=True)
     price = Column(Float, nullable=False)
     discounted_price = Column(Float, nullable=True)
-    gender = Column(String, nullable=True, index=True)
-    category = Column(String, nullable=True, index=True)
-    seller_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    gender = Column(String, nullable=True, index=True, default="unisex")
+    category = Column(String, nullable=True, index=True, default="general")
+    seller_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     is_verified = Column(Boolean, default=False, index=True)
     
     # Product verification fields
@@ -40,6 +55,14 @@ class Product(Base):
     variants = relationship("ProductVariant", back_populates="product", cascade="all, delete-orphan")
     images = relationship("ProductImage", back_populates="product", cascade="all, delete-orphan")
 
+    @validates("gender")
+    def _normalize_gender(self, key, value):
+        return normalize_product_gender_value(value)
+
+    @validates("category")
+    def _default_category(self, key, value):
+        return "general" if value is None else value
+
 class User(Base):
     __tablename__ = "users"
 
@@ -73,19 +96,34 @@ class User(Base):
     dob = Column(DateTime, nullable=True)  # Date of birth
 
     # Relationships
-    cart_items = relationship("CartItem", back_populates="user", cascade="all, delete-orphan")
-    wishlist_items = relationship("WishlistItem", back_populates="user", cascade="all, delete-orphan")
-    orders = relationship("Order", back_populates="user")
-    products = relationship("Product", back_populates="seller", foreign_keys="Product.seller_id")
-    addresses = relationship("Address", back_populates="user", cascade="all, delete-orphan")
+    # Users are loaded on every authenticated request, so collections never load
+    # implicitly; query them directly or opt in with selectinload()
+    cart_items = relationship("CartItem", back_populates="user", cascade="all, delete-orphan", lazy="raise")
+    wishlist_items = relationship("WishlistItem", back_populates="user", cascade="all, delete-orphan", lazy="raise")
+    orders = relationship("Order", back_populates="user", lazy="raise")
+    products = relationship("Product", back_populates="seller", foreign_keys="Product.seller_id", lazy="raise")
+    addresses = relationship("Address", back_populates="user", cascade="all, delete-orphan", lazy="raise")
 
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # One row per cart line; the conflict target for cart upserts.
+        # NULLs are coalesced so lines without a variant/size/color still collide
+        Index(
+            "ux_cart_items_line",
+            "user_id",
+            "product_id",
+            func.coalesce(literal_column("variant_id"), literal_column("0")),
+            func.coalesce(literal_column("size"), literal_column("''")),
+            func.coalesce(literal_column("color"), literal_column("''")),
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)  # Product deletes clear cart lines
     variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=True, index=True)
     quantity = Column(Integer, default=1)
     size = Column(String, nullable=True)  # Selected size (e.g., "M", "L") - kept for backward compatibility
@@ -93,12 +131,17 @@ class CartItem(Base):
 
     # Many-to-one relationships
     user = relationship("User", back_populates="cart_items")
-    product = relationship("Product")
+    # Load explicitly (selectinload) so per-line lookups can't creep back in
+    product = relationship("Product", lazy="raise")
     variant = relationship("ProductVariant")
 
 # ----- Order model -----
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # A customer's orders, newest first
+        Index("ix_orders_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -148,8 +191,8 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     variant_id = Column(Integer, ForeignKey("product_variants.id"), nullable=True, index=True)
     quantity = Column(Integer, default=1)
     price = Column(Float, nullable=False)  # price at time of purchase
@@ -177,6 +220,10 @@ class OrderItem(Base):
 
 class WishlistItem(Base):
     __tablename__ = "wishlist_items"
+    __table_args__ = (
+        # One row per (user, product); also serves user_id-only lookups
+        Index("ix_wishlist_user_product", "user_id", "product_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
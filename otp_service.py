@@ -0,0 +1,234 @@
+"""
+OTP service for email verification and password reset codes.
+
+OTPs are kept in Redis with a native TTL when REDIS_URL is set and the redis
+package is installed, so issuing and checking a code does not write the users
+table. Without Redis they fall back to the users.otp / users.otp_expiry columns.
+
+Only an HMAC-SHA256 digest of each OTP is stored, and submitted codes are
+compared in constant time.
+"""
+import os
+import hmac
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import update, case, func
+from sqlalchemy.orm import Session
+from models import User
+from email_utils import generate_otp
+from auth_utils import SECRET_KEY
+
+logger = logging.getLogger("fastecom.otp")
+
+# OTP expiration time: 10 minutes
+OTP_EXPIRY_MINUTES = 10
+
+# check_otp results
+OTP_VALID = "valid"
+OTP_MISSING = "missing"
+OTP_INVALID = "invalid"
+OTP_EXPIRED = "expired"
+
+# Rate limits (attempts per rolling window, per email)
+VERIFY_ATTEMPT_LIMIT = 5
+VERIFY_WINDOW_SECONDS = 60
+RESEND_LIMIT = 5
+RESEND_WINDOW_SECONDS = 300
+
+# Login attempts per identifier and per client IP, and signup attempts
+# per client IP; checked before any password is hashed or verified
+LOGIN_ATTEMPT_LIMIT = int(os.getenv("LOGIN_ATTEMPT_LIMIT", "5"))
+LOGIN_IP_LIMIT = int(os.getenv("LOGIN_IP_LIMIT", "30"))
+LOGIN_WINDOW_SECONDS = 60
+SIGNUP_IP_LIMIT = int(os.getenv("SIGNUP_IP_LIMIT", "10"))
+SIGNUP_WINDOW_SECONDS = 3600
+
+# Wrong codes allowed before the current OTP is invalidated
+MAX_FAILED_ATTEMPTS = 5
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+try:
+    import redis
+except ImportError:  # Redis is optional; fall back to the users table
+    redis = None
+
+redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True) if redis and REDIS_URL else None
+if REDIS_URL and redis_client is None:
+    logger.warning("REDIS_URL is set but the redis package is not installed; storing OTPs in the database")
+
+
+def _otp_key(email: str) -> str:
+    return f"otp:{email}"
+
+
+def _failed_key(email: str) -> str:
+    return f"otp-failed:{email}"
+
+
+def _otp_digest(otp: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), otp.encode(), hashlib.sha256).hexdigest()
+
+
+def _otp_matches(stored_digest: str, otp: str) -> bool:
+    return hmac.compare_digest(stored_digest, _otp_digest(otp))
+
+
+def issue_otp(user: User) -> str:
+    """
+    Generate a new OTP for a user, replacing any previous one.
+    Returns the plaintext OTP for emailing. The caller commits the session.
+    """
+    otp = generate_otp()
+    digest = _otp_digest(otp)
+    _reset_attempts(_failed_key(user.email))
+    if redis_client is not None:
+        redis_client.set(_otp_key(user.email), digest, ex=OTP_EXPIRY_MINUTES * 60)
+        user.otp = None
+        user.otp_expiry = None
+    else:
+        user.otp = digest
+        user.otp_expiry = datetime.utcnow() + timedelta(minutes=OTP_EXPIRY_MINUTES)
+    return otp
+
+
+def check_otp(user: User, otp: str) -> str:
+    """Check a submitted OTP without consuming it. Returns one of the OTP_* results."""
+    if redis_client is not None:
+        stored = redis_client.get(_otp_key(user.email))
+        if stored is not None:
+            return OTP_VALID if _otp_matches(stored, otp) else OTP_INVALID
+        # Nothing in Redis: expired, or issued before Redis was configured
+
+    if not user.otp:
+        return OTP_MISSING
+    if not _otp_matches(user.otp, otp):
+        return OTP_INVALID
+    if not user.otp_expiry or user.otp_expiry < datetime.utcnow():
+        return OTP_EXPIRED
+    return OTP_VALID
+
+
+# Delete the stored digest only if it matches, in one round-trip
+_CONSUME_OTP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_consume_otp_script = redis_client.register_script(_CONSUME_OTP_SCRIPT) if redis_client is not None else None
+
+
+def consume_otp(db: Session, email: str, otp: str) -> Optional[int]:
+    """
+    Atomically check and consume an OTP and activate the account with a single
+    UPDATE ... RETURNING. Customers are approved at the same time.
+    Returns the user id, or None if the OTP was missing, wrong or expired.
+    The caller commits the session.
+    """
+    digest = _otp_digest(otp)
+    activate = (
+        update(User)
+        .where(User.email == email)
+        .values(
+            is_active=True,
+            is_approved=case((User.role == "customer", True), else_=User.is_approved),
+            otp=None,
+            otp_expiry=None,
+        )
+        .returning(User.id)
+        # Runs before any User is loaded into the session, so there is
+        # nothing to synchronize; emit the bare UPDATE
+        .execution_options(synchronize_session=False)
+    )
+    if redis_client is not None and _consume_otp_script(keys=[_otp_key(email)], args=[digest]):
+        user_id = db.execute(activate).scalar()
+    else:
+        # Not in Redis (or no Redis): match against the users table columns.
+        # Expiry is checked against the database clock (CURRENT_TIMESTAMP, UTC)
+        user_id = db.execute(
+            activate.where(User.otp == digest, User.otp_expiry > func.now())
+        ).scalar()
+    if user_id is not None:
+        _reset_attempts(_failed_key(email))
+    return user_id
+
+
+def clear_otp(user: User) -> None:
+    """Invalidate a user's OTP after use. The caller commits the session."""
+    if redis_client is not None:
+        redis_client.delete(_otp_key(user.email))
+    user.otp = None
+    user.otp_expiry = None
+
+
+def record_failed_otp(user: User) -> bool:
+    """
+    Count a wrong OTP for a user. Once MAX_FAILED_ATTEMPTS is reached the
+    OTP is cleared and True is returned; the caller commits the session.
+    """
+    key = _failed_key(user.email)
+    if allow_attempt(key, MAX_FAILED_ATTEMPTS - 1, OTP_EXPIRY_MINUTES * 60):
+        return False
+    clear_otp(user)
+    _reset_attempts(key)
+    logger.warning(f"OTP invalidated after {MAX_FAILED_ATTEMPTS} failed attempts for user: {user.email}")
+    return True
+
+
+# ==================== RATE LIMITING ====================
+
+# Rolling-window limiter: drop hits older than the window, count, and record
+# this hit if under the limit, in one atomic Redis round-trip.
+_RATE_LIMIT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+_rate_limit = redis_client.register_script(_RATE_LIMIT_SCRIPT) if redis_client is not None else None
+
+# In-process fallback when Redis is not configured (per worker)
+_local_hits: dict[str, deque] = {}
+_local_lock = threading.Lock()
+_LOCAL_MAX_KEYS = 10000
+_LOCAL_PRUNE_SECONDS = 3600
+
+
+def allow_attempt(key: str, limit: int, window_seconds: int) -> bool:
+    """Record an attempt for key; False if limit attempts were already made in the window"""
+    if redis_client is not None:
+        return bool(_rate_limit(
+            keys=[f"ratelimit:{key}"],
+            args=[time.time(), window_seconds, limit, uuid.uuid4().hex],
+        ))
+
+    now = time.monotonic()
+    with _local_lock:
+        if len(_local_hits) > _LOCAL_MAX_KEYS:
+            for stale in [k for k, hits in _local_hits.items() if not hits or hits[-1] < now - _LOCAL_PRUNE_SECONDS]:
+                del _local_hits[stale]
+        hits = _local_hits.setdefault(key, deque())
+        while hits and hits[0] <= now - window_seconds:
+            hits.popleft()
+        if len(hits) >= limit:
+            return False
+        hits.append(now)
+        return True
+
+
+def _reset_attempts(key: str) -> None:
+    if redis_client is not None:
+        redis_client.delete(f"ratelimit:{key}")
+    else:
+        with _local_lock:
+            _local_hits.pop(key, None)
@@ -80,11 +80,42 @@ class Product(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductCard(BaseModel):
+    """The subset of Product a listing card shows (?view=card on the listing endpoints)"""
+    id: int
+    name: str
+    description: str | None = None
+    image_url: str | None = None
+    price: float
+    discounted_price: float | None = None
+    gender: Literal['men','women','unisex'] | None = None
+    category: str | None = None
+    stock: int | None = None
+    status: str | None = None  # "IN_STOCK", "LOW_STOCK", "OUT_OF_STOCK"
+    images: List["ProductImageResponse"] = []
+
+    class Config:
+        from_attributes = True
+
 class ProductListResponse(BaseModel):
     items: List[Product]
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[int] = None  # pass as ?cursor= to fetch the following page
+
+    class Config:
+        from_attributes = True
+
+class ProductCardListResponse(BaseModel):
+    items: List[ProductCard]
+    total: int
+    page: int
+    page_size: int
+    next_cursor: Optional[int] = None
+
+    class Config:
+        from_attributes = True
 
 class ProductBulkUpdate(BaseModel):
     product_ids: List[int]
@@ -238,6 +269,12 @@ class WishlistItemResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class WishlistStatusResponse(BaseModel):
+    in_wishlist: bool
+
+class WishlistBulkCheckRequest(BaseModel):
+    product_ids: List[int]
+
 class VerifyOTPRequest(BaseModel):
     email: str
     otp: str
@@ -452,6 +489,9 @@ class ProductUpdate(BaseModel):
 class RejectProductRequest(BaseModel):
     notes: Optional[str] = None
 
+class BulkIdsRequest(BaseModel):
+    ids: List[int]
+
 # Return Request Schemas
 class ReturnRequestCreate(BaseModel):
     reason: str